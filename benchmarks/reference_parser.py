@@ -0,0 +1,367 @@
+"""Frozen copy of bg2obs.py's passage parser as it was before the single-pass rewrite.
+
+benchmarks/run.py diffs bg2obs.parse_passage() against parse_passage() here,
+so this file must not follow later changes to bg2obs.py: it is the reference
+the optimised parsers are held to.
+"""
+import html
+import re
+from html.parser import HTMLParser
+
+PASSAGE_CLASSES = {"passage-text"}
+FOOTNOTE_CONTAINER_CLASSES = {"footnotes"}
+FOOTNOTE_CONTAINER_IDS = {"footnotes"}
+IGNORE_CLASSES = {
+    "crossreference",
+    "crossref",
+    "crossrefs",
+    "crossref-block",
+    "crossref-list",
+    "footnotes",
+    "footnote-text",
+    "footnote-ref",
+    "translation-note",
+    "publisher-info-bottom",
+    "passage-other-trans",
+    "passage-parallel",
+    "passage-related",
+    "passage-display",
+}
+SKIP_TAGS = {"script", "style", "noscript"}
+
+
+class BibleGatewayParser(HTMLParser):
+    def __init__(self, include_headers, bold_words, include_footnotes):
+        super().__init__()
+        self.include_headers = include_headers
+        self.bold_words = bold_words
+        self.include_footnotes = include_footnotes
+        self.passage_depth = 0
+        self.skip_depth = 0
+        self.woj_depth = 0
+        self.in_versenum = False
+        self.versenum_buf = []
+        self.in_chapternum = False
+        self.chapternum_buf = []
+        self.skip_next_versenum = None
+        self.in_heading = False
+        self.heading_buf = []
+        self.in_footnote_ref = False
+        self.footnote_ref_buf = []
+        self.footnote_ref_id = None
+        self.footnote_ref_map = {}
+        self.used_labels = set()
+        self.out = []
+
+    def _classes(self, attrs):
+        for k, v in attrs:
+            if k == "class" and v:
+                return set(v.split())
+        return set()
+
+    def _start_passage(self, tag, classes):
+        if self.passage_depth == 0 and tag == "div" and classes & PASSAGE_CLASSES:
+            self.passage_depth = 1
+            return True
+        return False
+
+    def _append(self, text):
+        if text:
+            self.out.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        classes = self._classes(attrs)
+        if self._start_passage(tag, classes):
+            return
+
+        if self.passage_depth == 0:
+            return
+
+        self.passage_depth += 1
+
+        if self.skip_depth > 0:
+            self.skip_depth += 1
+            return
+
+        if tag in SKIP_TAGS:
+            self.skip_depth = 1
+            return
+
+        if classes & IGNORE_CLASSES or any("crossref" in c for c in classes):
+            self.skip_depth = 1
+            return
+
+        if self.woj_depth > 0:
+            self.woj_depth += 1
+
+        if tag in {"h1", "h2", "h3", "h4", "h5", "h6"}:
+            self.in_heading = True
+            self.heading_buf = []
+            return
+
+        if tag in {"sup", "span"} and "versenum" in classes:
+            self.in_versenum = True
+            self.versenum_buf = []
+            return
+
+        if tag in {"sup", "span"} and "chapternum" in classes:
+            self.in_chapternum = True
+            self.chapternum_buf = []
+            return
+
+        if tag == "sup" and "footnote" in classes:
+            if not self.include_footnotes:
+                self.skip_depth = 1
+                return
+            self.in_footnote_ref = True
+            self.footnote_ref_buf = []
+            self.footnote_ref_id = None
+            for k, v in attrs:
+                if k == "data-fn" and v:
+                    self.footnote_ref_id = v.lstrip("#")
+                    break
+            return
+
+        if self.bold_words and "woj" in classes:
+            self.woj_depth = 1
+            self._append("**")
+
+        if tag == "br":
+            self._append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.passage_depth == 0:
+            return
+
+        if self.skip_depth > 0:
+            self.skip_depth -= 1
+            self.passage_depth -= 1
+            return
+
+        if self.in_heading and tag in {"h1", "h2", "h3", "h4", "h5", "h6"}:
+            self.in_heading = False
+            if self.include_headers:
+                heading = "".join(self.heading_buf).strip()
+                if heading:
+                    self._append("\n\n##### " + heading + "\n")
+            self.passage_depth -= 1
+            return
+
+        if self.in_versenum and tag in {"sup", "span"}:
+            self.in_versenum = False
+            num = "".join(self.versenum_buf).strip()
+            if num and self.skip_next_versenum == num:
+                self.skip_next_versenum = None
+            elif num:
+                self._append("\n\n###### " + num + "\n")
+            self.passage_depth -= 1
+            return
+
+        if self.in_chapternum and tag in {"sup", "span"}:
+            self.in_chapternum = False
+            num = "1"
+            self._append("\n\n###### " + num + "\n")
+            self.skip_next_versenum = num
+            self.passage_depth -= 1
+            return
+
+        if self.in_footnote_ref and tag == "sup":
+            self.in_footnote_ref = False
+            label = "".join(self.footnote_ref_buf)
+            label = re.sub(r"[^A-Za-z0-9]+", "", label).lower()
+            label = self._register_label(label)
+            if self.footnote_ref_id:
+                self.footnote_ref_map[self.footnote_ref_id] = label
+            self._append(f"[^{label}]")
+            self.footnote_ref_buf = []
+            self.footnote_ref_id = None
+            self.passage_depth -= 1
+            return
+
+        if self.woj_depth > 0:
+            self.woj_depth -= 1
+            if self.woj_depth == 0 and self.bold_words:
+                self._append("**")
+
+        if tag == "p":
+            self._append("\n\n")
+
+        self.passage_depth -= 1
+
+    def handle_data(self, data):
+        if self.passage_depth == 0 or self.skip_depth > 0:
+            return
+
+        if self.in_versenum:
+            self.versenum_buf.append(data)
+            return
+
+        if self.in_chapternum:
+            self.chapternum_buf.append(data)
+            return
+
+        if self.in_heading:
+            self.heading_buf.append(data)
+            return
+
+        if self.in_footnote_ref:
+            self.footnote_ref_buf.append(data)
+            return
+
+        self._append(data)
+
+    def _register_label(self, label):
+        if not label:
+            label = str(len(self.used_labels) + 1)
+        original = label
+        suffix = 1
+        while label in self.used_labels:
+            suffix += 1
+            label = f"{original}{suffix}"
+        self.used_labels.add(label)
+        return label
+
+class FootnoteParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.in_container = False
+        self.container_depth = 0
+        self.in_item = False
+        self.item_depth = 0
+        self.item_buf = []
+        self.footnotes = []
+        self.item_id = None
+        self.in_anchor = False
+        self.ref_buf = []
+        self.in_note_text = False
+        self.note_buf = []
+
+    def _classes(self, attrs):
+        for k, v in attrs:
+            if k == "class" and v:
+                return set(v.split())
+        return set()
+
+    def _has_id(self, attrs, ids):
+        for k, v in attrs:
+            if k == "id" and v in ids:
+                return True
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        classes = self._classes(attrs)
+        if not self.in_container and tag == "div":
+            if classes & FOOTNOTE_CONTAINER_CLASSES or self._has_id(attrs, FOOTNOTE_CONTAINER_IDS):
+                self.in_container = True
+                self.container_depth = 1
+                return
+
+        if not self.in_container:
+            return
+
+        if tag in SKIP_TAGS:
+            return
+
+        self.container_depth += 1
+
+        if self.in_item:
+            self.item_depth += 1
+            if tag == "a" and not self.ref_buf:
+                self.in_anchor = True
+            if tag == "span" and "footnote-text" in classes:
+                self.in_note_text = True
+            return
+
+        if tag == "li" or ("footnote-text" in classes) or (tag == "div" and "footnote" in classes):
+            self._start_item(attrs)
+            return
+
+        if tag == "a" and self.in_item and not self.ref_buf:
+            self.in_anchor = True
+
+    def _start_item(self, attrs):
+        if self.in_item:
+            return
+        self.in_item = True
+        self.item_depth = 1
+        self.item_buf = []
+        self.ref_buf = []
+        self.note_buf = []
+        self.item_id = None
+        for k, v in attrs:
+            if k == "id" and v:
+                self.item_id = v
+                break
+
+    def handle_endtag(self, tag):
+        if not self.in_container:
+            return
+
+        if self.in_item:
+            self.item_depth -= 1
+            if tag == "a" and self.in_anchor:
+                self.in_anchor = False
+            if tag == "span" and self.in_note_text:
+                self.in_note_text = False
+            if self.item_depth == 0:
+                ref = "".join(self.ref_buf).strip()
+                note = "".join(self.note_buf).strip() or "".join(self.item_buf).strip()
+                if note:
+                    self.footnotes.append((self.item_id, ref, note))
+                self.in_item = False
+                self.item_buf = []
+                self.ref_buf = []
+                self.note_buf = []
+                self.item_id = None
+        self.container_depth -= 1
+        if self.container_depth == 0:
+            self.in_container = False
+
+    def handle_data(self, data):
+        if self.in_item:
+            self.item_buf.append(data)
+            if self.in_anchor:
+                self.ref_buf.append(data)
+            if self.in_note_text:
+                self.note_buf.append(data)
+
+
+def normalize_markdown(text):
+    text = html.unescape(text)
+    text = text.replace("\u00a0", " ")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    return text.strip()
+
+
+def parse_passage(html_text, include_headers, bold_words, include_footnotes):
+    parser = BibleGatewayParser(
+        include_headers=include_headers,
+        bold_words=bold_words,
+        include_footnotes=include_footnotes,
+    )
+    parser.feed(html_text)
+    parser.close()
+    content = normalize_markdown("".join(parser.out))
+
+    footnotes = []
+    footnote_map = {}
+    if include_footnotes:
+        footnote_parser = FootnoteParser()
+        footnote_parser.feed(html_text)
+        footnote_parser.close()
+        for item_id, ref, note in footnote_parser.footnotes:
+            cleaned_ref = normalize_markdown(ref)
+            cleaned_note = normalize_markdown(note)
+            if cleaned_note:
+                footnotes.append((item_id, cleaned_ref, cleaned_note))
+        footnote_map = parser.footnote_ref_map
+    return content, footnotes, footnote_map
+
+
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""Benchmark suite for bg2obs.py.
+
+Usage:
+  python benchmarks/run.py [--output FILE] [--rounds N] [--e2e-books N] [--skip-e2e]
+                           [--latency MS] [--jitter MS] [--jobs N] [-- BG2OBS_ARGS...]
+  python benchmarks/run.py compare OLD.json NEW.json
+  python benchmarks/run.py record [--version WEB]
+
+The default run times the hot functions on every fixture page, checks that the
+optimised code paths still produce the same output as the reference ones, and
+downloads the whole Bible from the local stand-in in benchmarks/server.py.
+Results are printed and, with --output, written as JSON for `compare`.
+"""
+import argparse
+import html
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import bg2obs
+import reference_parser
+import server
+
+# Fixture name -> (book, chapter) it stands in for. The shipped pages are
+# hand-written in BibleGateway's print layout, each a complete chapter of the
+# WEB text; `record` replaces them with the real pages.
+FIXTURE_SOURCES = {
+    "prose": ("Genesis", 1),
+    "poetry": ("Psalms", 23),
+    "footnotes": ("Genesis", 4),
+    "words-of-jesus": ("John", 3),
+}
+
+
+def bench(func, rounds):
+    """Return per-call timings in milliseconds for `rounds` repeats of an auto-sized loop."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = timer.repeat(repeat=rounds, number=number)
+    per_call = [elapsed / number * 1000 for elapsed in times]
+    return {"min_ms": min(per_call), "median_ms": statistics.median(per_call), "loops": number}
+
+
+def reference_normalize_markdown(text):
+    """normalize_markdown() as it was before the cleanup passes were precompiled."""
+    text = html.unescape(text)
+    text = text.replace("\u00a0", " ")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    return text.strip()
+
+
+def reference_remove_crossref_lines(text, book, chapter):
+    """remove_crossref_lines() as it was before the per-book pattern."""
+    pattern = re.compile(rf"^{re.escape(book)}\s+{chapter}\s*:\s*\d+\s*:", re.IGNORECASE)
+    next_pattern = re.compile(rf"^{re.escape(book)}\s+\d+Next$", re.IGNORECASE)
+    noise = re.compile(r"(freestar|Buy Now|Our Price|Retail:|View more titles|dropdown)", re.IGNORECASE)
+    kept = []
+    for line in text.splitlines():
+        normalized = line.replace("\u00a0", " ")
+        compact = re.sub(r"\s+", " ", normalized).strip()
+        if pattern.match(compact):
+            continue
+        if next_pattern.match(compact):
+            continue
+        if noise.search(compact):
+            continue
+        kept.append(compact)
+    return "\n".join(kept).strip()
+
+
+# Text the cleanup functions must treat exactly as the reference ones do.
+CLEANUP_FIXTURES = [
+    "",
+    "  plain\ttext  with\u00a0\u00a0spaces \t\n\n\n\nnext &amp; last &nbsp; \r\nline\rend\t",
+    "Genesis 1:1: In the beginning\nGenesis 12:3: other chapter\ngenesis  1 : 2 :lower case\nGenesis 1Next\n"
+    "Genesis 2next\nGenesis 12:3: Buy Now\n\u00a0\nkept line Our price here\nretail: 5\nfreestar ad\n"
+    "View more titles\nDropdown\nExodus 1:1: another book\n1 Genesis 1:1: not at the start\n",
+    "Song of Solomon 1:2: x\nSong of Solomon 1Next\nSong  of Solomon 1:3: spaced name\n\x0bv\x0cf\u2028s\x85n",
+    "“Quoted” text\nOur prıce\nfreeſtar\nRETAİL: 3\nGenesis 1:2:\u00a0dotless ı",
+]
+
+
+# Markup inserted into the passage of each fixture: each one either goes through
+# the fast tokenizer or makes it hand the page to html.parser.
+PARSER_MUTATIONS = [
+    "<script>var ad = '<div class=\"passage-text\">';</script>",
+    "<style>p { margin: 0 }</style >",
+    "<br/><BR><br />",
+    "<!-- comment --><!-- comment -- with dashes --><!-->",
+    "<span CLASS='woj' data-x=a>Upper &amp; case</span>",
+    "1 < 2 &lt; 3 &c",
+    "<img src=a/><img src='a' />",
+    "<sup class=\"footnote\" data-fn=\"#fen-WEB-x&amp;y\">[<a>z</a>]</sup>",
+    "<?php echo 1 ?>",
+    "<div class=\"a>b\">x</div>",
+    "</span class=x>",
+]
+
+
+FLAG_COMBINATIONS = [
+    (False, False, False),
+    (True, True, True),
+    (True, False, True),
+    (False, True, False),
+]
+
+
+def run_checks(pages):
+    """Compare optimised code paths with their reference implementation on every fixture."""
+    checks = {
+        "single_pass_vs_two_pass": [],
+        "preslice_vs_full_page": [],
+        "cached_model_vs_parse": [],
+        "cleanup_vs_reference": [],
+        "fast_parser_vs_html_parser": [],
+        "verse_check": [],
+        "batched_vs_single_chapter": batched_vs_single_chapter(pages),
+        "stream_stop_vs_full_page": [],
+        "stored_verse_text": stored_verse_text(pages),
+    }
+    if [len(counts) for counts in bg2obs.VERSE_COUNTS] != bg2obs.BOOK_CHAPTERS:
+        checks["verse_check"].append("VERSE_COUNTS does not match BOOK_CHAPTERS")
+    if sum(map(sum, bg2obs.VERSE_COUNTS)) != 31102:
+        checks["verse_check"].append("VERSE_COUNTS does not add up to the 31,102 verses of the KJV")
+    for name, page in pages.items():
+        # One model with footnotes, round-tripped through JSON as the cache stores it, renders every variant.
+        model = json.loads(json.dumps(bg2obs.parse_chapter_model(page, True)))
+        for flags in FLAG_COMBINATIONS:
+            result = bg2obs.parse_passage(page, *flags)
+            if result != bg2obs.parse_passage(page, *flags, preslice=False):
+                checks["preslice_vs_full_page"].append(f"{name} {flags}")
+            if result != bg2obs.render_model(model, *flags):
+                checks["cached_model_vs_parse"].append(f"{name} {flags}")
+            for preslice in (True, False):
+                expected = result if preslice else bg2obs.parse_passage(page, *flags, preslice=False)
+                if bg2obs.parse_passage(page, *flags, preslice=preslice, engine="fast") != expected:
+                    checks["fast_parser_vs_html_parser"].append(f"{name} {flags} preslice={preslice}")
+        # The fixtures themselves must not need the html.parser fallback, or the benchmark times the wrong engine.
+        fast = bg2obs.FastPassageParser(True)
+        fast.feed(page)
+        fast.close()
+        if fast.fell_back:
+            checks["fast_parser_vs_html_parser"].append(f"{name} fell back to html.parser")
+        # Every variant must match the frozen pre-rewrite parser, on the fixture and on each mutated copy.
+        passage_start = bg2obs.find_div_region(page, bg2obs.PASSAGE_START_RE)[0]
+        insert_at = page.index(">", passage_start) + 1
+        for index, mutation in enumerate([""] + PARSER_MUTATIONS):
+            mutated = page[:insert_at] + mutation + page[insert_at:]
+            for flags in FLAG_COMBINATIONS:
+                expected = reference_parser.parse_passage(mutated, *flags)
+                for engine in sorted(bg2obs.PARSER_ENGINES):
+                    if bg2obs.parse_passage(mutated, *flags, engine=engine) != expected:
+                        label = f"mutation #{index - 1}" if index else "unchanged"
+                        checks["single_pass_vs_two_pass"].append(f"{name} {label} {flags} {engine}")
+        for index, mutation in enumerate(PARSER_MUTATIONS):
+            mutated = page[:insert_at] + mutation + page[insert_at:]
+            for include_footnotes in (True, False):
+                expected = bg2obs.parse_chapter_model(mutated, include_footnotes)
+                if bg2obs.parse_chapter_model(mutated, include_footnotes, engine="fast") != expected:
+                    checks["fast_parser_vs_html_parser"].append(f"{name} mutation #{index}")
+        # Where --stream stops reading must not change what the parser sees, whatever the chunk size.
+        for index, mutated in enumerate([page] + [page[:insert_at] + m + page[insert_at:] for m in PARSER_MUTATIONS]):
+            for include_footnotes in (True, False):
+                for size in (61, 997, bg2obs.STREAM_CHUNK):
+                    watch = bg2obs.PassageWatch(include_footnotes)
+                    stop = next(
+                        (end + size for end in range(0, len(mutated), size) if watch(mutated[end:end + size])), None
+                    )
+                    label = f"{name} mutation #{index - 1}" if index else name
+                    if stop is None and index == 0:
+                        checks["stream_stop_vs_full_page"].append(f"{label} never stopped, chunks of {size}")
+                    expected = bg2obs.passage_slices(mutated, include_footnotes)
+                    if stop is not None and bg2obs.passage_slices(mutated[:stop], include_footnotes) != expected:
+                        checks["stream_stop_vs_full_page"].append(f"{label} stopped early, chunks of {size}")
+        raw = "".join(value for kind, value in model["events"] if kind == "text")
+        texts = [raw, reference_normalize_markdown(raw)] + [ref + "\n" + note for _, ref, note in model["footnotes"]]
+        texts += CLEANUP_FIXTURES
+        book, chapter = FIXTURE_SOURCES.get(name, ("Genesis", 1))
+        # The fixture must pass the verse check as it is, and a verse dropped from
+        # it must count as a gap, so the chapter is fetched again.
+        markers = [value for kind, value in model["events"] if kind == "verse"]
+        book_index = bg2obs.BOOK_SEARCH_NAMES.index(book)
+        if bg2obs.verse_anomaly("WEB", book_index, chapter, markers) is not None:
+            checks["verse_check"].append(f"{name} as recorded")
+        del markers[len(markers) // 2]
+        anomaly = bg2obs.verse_anomaly("WEB", book_index, chapter, markers)
+        if not anomaly or anomaly[0] != "gap":
+            checks["verse_check"].append(f"{name} with a verse dropped")
+        for index, text in enumerate(texts):
+            if bg2obs.normalize_markdown(text) != reference_normalize_markdown(text):
+                checks["cleanup_vs_reference"].append(f"{name} normalize_markdown #{index}")
+            for cleanup_book, cleanup_chapter in ((book, chapter), ("Genesis", 1), ("Song of Solomon", 1)):
+                expected = reference_remove_crossref_lines(text, cleanup_book, cleanup_chapter)
+                if bg2obs.remove_crossref_lines(text, cleanup_book, cleanup_chapter) != expected:
+                    checks["cleanup_vs_reference"].append(f"{name} remove_crossref_lines #{index} {cleanup_book}")
+    return checks
+
+
+def batched_vs_single_chapter(pages, book="Genesis", batch=5):
+    """Render a book from the stand-in's range pages and chapter by chapter; return the chapters that differ.
+
+    Each chapter is compared byte for byte as it would be written, with and
+    without footnotes, so labels that run on across a range page show up.
+    """
+    cwd = os.getcwd()
+    os.chdir(REPO_DIR)
+    try:
+        locale = bg2obs.load_locale("en")
+    finally:
+        os.chdir(cwd)
+    stand_in = server.StandIn(pages)
+    book_index = bg2obs.BOOK_SEARCH_NAMES.index(book)
+    chapters = list(range(1, bg2obs.BOOK_CHAPTERS[book_index] + 1))
+    infos = bg2obs.chapter_infos([locale], [(book_index, chapters)])
+    variants = [
+        (0, bg2obs.RenderOptions(True, True, True, True, False, True, True)),
+        (0, bg2obs.RenderOptions(False, False, False, False, True, False, True)),
+    ]
+    differences = []
+    for start in range(0, len(chapters), batch):
+        numbers = chapters[start:start + batch]
+        page = stand_in.page_for(f"{book}{numbers[0]}-{numbers[-1]}")
+        job = (page, [infos[(book_index, chapter)] for chapter in numbers], variants, None, False, False, "html")
+        batched = bg2obs.render_batch(job)
+        for index, chapter in enumerate(numbers):
+            page = stand_in.page_for(f"{book}{chapter}")
+            job = (page, [infos[(book_index, chapter)]], variants, None, False, False, "html")
+            single = bg2obs.render_batch(job)[0][0]
+            if batched is None or batched[index][0] != single:
+                differences.append(f"{book} {chapter}")
+    return differences
+
+
+def stored_verse_text(pages):
+    """Store every fixture in a VerseStore and return the verses whose text does not read as on the page."""
+    problems = []
+    store = bg2obs.VerseStore(":memory:")
+    try:
+        for book, (name, page) in enumerate(sorted(pages.items()), 1):
+            store.put_chapter("WEB", book, 1, bg2obs.parse_chapter_model(page, True))
+        rows = store.db.execute("SELECT verse, text FROM verses").fetchall()
+        problems += [f"verse {verse}: {text!r}" for verse, text in rows if text != " ".join(text.split()) or not text]
+        if "poetry" in pages:
+            found = [row[4] for row in store.search("shepherd")]
+            if found != ["Yahweh is my shepherd; I shall lack nothing."]:
+                problems.append(f"poetry verse 1 found by search as {found!r}")
+    finally:
+        store.close()
+    return problems
+
+
+def run_parsers(pages, rounds):
+    """Return the chapters parsed per second by each --parser engine, over all fixtures."""
+    results = {}
+    for engine in sorted(bg2obs.PARSER_ENGINES):
+        def parse_all():
+            for page in pages.values():
+                bg2obs.parse_chapter_model(page, True, engine=engine)
+
+        timing = bench(parse_all, rounds)
+        results[engine] = {"chapters_per_second": len(pages) / (timing["min_ms"] / 1000), **timing}
+    return results
+
+
+def write_bsb_file(path):
+    """Write a BSB-format text of the full Bible's size, using the English book names."""
+    books = bg2obs.load_lines(os.path.join(REPO_DIR, "locales", "en", "books.txt"))
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write("The Holy Bible, Berean Standard Bible, BSB\n")
+        handle.write("This text of God's Word has been dedicated to the public domain.\n")
+        handle.write("Verse\tBerean Standard Bible\n")
+        for book, chapters in zip(books, bg2obs.BOOK_CHAPTERS):
+            for chapter in range(1, chapters + 1):
+                for verse in range(1, 27):
+                    handle.write(
+                        f"{book} {chapter}:{verse}\tIn the beginning God created the heavens and the earth.\n"
+                    )
+
+
+def run_micro(pages, rounds):
+    results = {}
+    for name, page in pages.items():
+        book, chapter = FIXTURE_SOURCES.get(name, ("Genesis", 1))
+        results[f"parse_passage[{name}]"] = bench(lambda: bg2obs.parse_passage(page, True, True, True), rounds)
+        results[f"parse_passage_fast[{name}]"] = bench(
+            lambda: bg2obs.parse_passage(page, True, True, True, engine="fast"), rounds
+        )
+        results[f"parse_passage_full_page[{name}]"] = bench(
+            lambda: bg2obs.parse_passage(page, True, True, True, preslice=False), rounds
+        )
+        results[f"two_pass_parse[{name}]"] = bench(lambda: reference_parser.parse_passage(page, True, True, True), rounds)
+
+        model = bg2obs.parse_chapter_model(page, True)
+        results[f"render_model[{name}]"] = bench(lambda: bg2obs.render_model(model, True, True, True), rounds)
+
+        raw = "".join(value for kind, value in model["events"] if kind == "text")
+        content = bg2obs.normalize_markdown(raw)
+        results[f"normalize_markdown[{name}]"] = bench(lambda: bg2obs.normalize_markdown(raw), rounds)
+        results[f"reference_normalize_markdown[{name}]"] = bench(lambda: reference_normalize_markdown(raw), rounds)
+        results[f"remove_crossref_lines[{name}]"] = bench(
+            lambda: bg2obs.remove_crossref_lines(content, book, chapter), rounds
+        )
+        results[f"reference_remove_crossref_lines[{name}]"] = bench(
+            lambda: reference_remove_crossref_lines(content, book, chapter), rounds
+        )
+        notes = [text for item in model["footnotes"] for text in item[1:]]
+        results[f"normalize_footnotes[{name}]"] = bench(
+            lambda: [bg2obs.normalize_markdown(text) for text in notes], rounds
+        )
+        results[f"reference_normalize_footnotes[{name}]"] = bench(
+            lambda: [reference_normalize_markdown(text) for text in notes], rounds
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bsb_path = os.path.join(tmp, "bsb.txt")
+        write_bsb_file(bsb_path)
+
+        def load_cold():
+            if os.path.exists(bsb_path + ".idx"):
+                os.remove(bsb_path + ".idx")
+            return bg2obs.load_bsb_index(bsb_path)
+
+        results["load_bsb_index_cold"] = bench(load_cold, max(1, rounds // 2))
+        results["load_bsb_index"] = bench(lambda: bg2obs.load_bsb_index(bsb_path), rounds)
+        bsb_index = bg2obs.load_bsb_index(bsb_path)
+        results["build_bsb_chapter_content"] = bench(
+            lambda: bg2obs.build_bsb_chapter_content("Psalms", 119, bsb_index), rounds
+        )
+    return results
+
+
+def run_e2e(latency, jitter, jobs, books, extra_args):
+    """Download the Bible (or its first `books` books) from the local stand-in."""
+    stand_in = server.start_server(latency=latency / 1000, jitter=jitter / 1000)
+    work_dir = tempfile.mkdtemp(prefix="bg2obs-bench-")
+    try:
+        shutil.copytree(os.path.join(REPO_DIR, "locales"), os.path.join(work_dir, "locales"))
+        book_names = bg2obs.load_lines(os.path.join(REPO_DIR, "locales", "en", "books.txt"))
+        selections = [[]] if books is None else [["--book", name] for name in book_names[:books]]
+        chapters = sum(bg2obs.BOOK_CHAPTERS[:books]) if books is not None else sum(bg2obs.BOOK_CHAPTERS)
+
+        start = time.perf_counter()
+        for selection in selections:
+            command = [
+                sys.executable, os.path.join(REPO_DIR, "bg2obs.py"),
+                "--base-url", stand_in.base_url, "--rate", "0", "--jobs", str(jobs),
+            ] + selection + extra_args
+            completed = subprocess.run(
+                command, cwd=work_dir, input="yes\n", capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                raise RuntimeError(f"bg2obs.py failed: {completed.stdout[-500:]}{completed.stderr[-2000:]}")
+        elapsed = time.perf_counter() - start
+    finally:
+        stand_in.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "chapters": chapters,
+        "seconds": elapsed,
+        "chapters_per_second": chapters / elapsed,
+        "requests": stand_in.requests,
+        "bytes_sent": stand_in.bytes_sent,
+        "latency_ms": latency,
+        "jitter_ms": jitter,
+        "jobs": jobs,
+        "args": extra_args,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(description="Run the bg2obs benchmark suite.")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--e2e-books", type=int, help="only download the first N books end to end")
+    parser.add_argument("--latency", type=float, default=20.0, help="stand-in delay per request in ms")
+    parser.add_argument("--jitter", type=float, default=10.0, help="stand-in delay variation in ms")
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("bg2obs_args", nargs="*", help="extra bg2obs.py options for the end-to-end run")
+    args = parser.parse_args(argv)
+
+    pages = server.load_fixtures()
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fixtures": sorted(pages),
+        "checks": run_checks(pages),
+        "micro": run_micro(pages, args.rounds),
+        "parsers": run_parsers(pages, args.rounds),
+    }
+    if not args.skip_e2e:
+        results["e2e"] = run_e2e(args.latency, args.jitter, args.jobs, args.e2e_books, args.bg2obs_args)
+
+    for check, failures in results["checks"].items():
+        print(f"{check:40} {'ok' if not failures else 'MISMATCH: ' + ', '.join(failures)}")
+    for name, timing in results["micro"].items():
+        print(f"{name:40} {timing['min_ms']:9.3f} ms")
+    for engine, timing in results["parsers"].items():
+        print(f"{'chapters parsed/s [' + engine + ']':40} {timing['chapters_per_second']:9.1f} /s")
+    if "e2e" in results:
+        e2e = results["e2e"]
+        print(
+            f"{'end to end':40} {e2e['seconds']:9.2f} s  "
+            f"({e2e['chapters']} chapters, {e2e['chapters_per_second']:.1f}/s, {e2e['requests']} requests)"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+    return 1 if any(results["checks"].values()) else 0
+
+
+def compare(argv):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args(argv)
+
+    with open(args.old, "r", encoding="utf-8") as handle:
+        old = json.load(handle)
+    with open(args.new, "r", encoding="utf-8") as handle:
+        new = json.load(handle)
+
+    print(f"{'benchmark':40} {old.get('commit') or 'old':>10} {new.get('commit') or 'new':>10}   change")
+    for name, timing in new["micro"].items():
+        if name not in old["micro"]:
+            continue
+        before = old["micro"][name]["min_ms"]
+        after = timing["min_ms"]
+        print(f"{name:40} {before:8.3f}ms {after:8.3f}ms {after / before - 1:+8.1%}")
+    for engine, timing in new.get("parsers", {}).items():
+        if engine not in old.get("parsers", {}):
+            continue
+        before = old["parsers"][engine]["chapters_per_second"]
+        after = timing["chapters_per_second"]
+        print(f"{'chapters parsed/s [' + engine + ']':40} {before:8.1f}/s {after:8.1f}/s {after / before - 1:+8.1%}")
+    if "e2e" in old and "e2e" in new:
+        before = old["e2e"]["seconds"]
+        after = new["e2e"]["seconds"]
+        print(f"{'end to end':40} {before:9.2f}s {after:9.2f}s {after / before - 1:+8.1%}")
+    return 0
+
+
+def record(argv):
+    parser = argparse.ArgumentParser(description="Replace the fixtures with pages from the live site.")
+    parser.add_argument("--version", default="WEB")
+    parser.add_argument("--base-url", default=bg2obs.BASE_URL)
+    args = parser.parse_args(argv)
+
+    transport = bg2obs.HTTPTransport(args.base_url)
+    for name, (book, chapter) in FIXTURE_SOURCES.items():
+        page = bg2obs.fetch_passage(book, chapter, args.version, transport)
+        with open(os.path.join(server.FIXTURE_DIR, f"{name}.html"), "w", encoding="utf-8") as handle:
+            handle.write(page)
+        print(f"Recorded {book} {chapter} ({args.version}) as {name}.html")
+        time.sleep(1)
+    transport.close()
+    return 0
+
+
+def main():
+    argv = sys.argv[1:]
+    if argv and argv[0] == "compare":
+        return compare(argv[1:])
+    if argv and argv[0] == "record":
+        return record(argv[1:])
+    return run(argv)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
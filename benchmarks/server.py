@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Local stand-in for BibleGateway that serves the fixture pages.
+
+Usage: python benchmarks/server.py [--port 8000] [--latency MS] [--jitter MS]
+
+Every passage request is answered with one of the fixture pages, relabelled
+with the requested chapter, so a full-Bible run can be pointed at it with
+`bg2obs.py --base-url http://127.0.0.1:8000`. Range searches ("Genesis1-5")
+get one passage per chapter, the way BibleGateway returns them.
+"""
+import argparse
+import gzip
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+import bg2obs
+
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+SEARCH_RE = re.compile(r"^(.*?)(\d+)(?:-(\d+))?$")
+VERSE_CLASS_RE = re.compile(r"(class=\"text \w+-)\d+(-\d+\")")
+CHAPTERNUM_RE = re.compile(r"(<span class=\"chapternum\">)\d+")
+FOOTNOTE_REF_RE = re.compile(r"(<li id=\"fen-[^\"]*\"><a [^>]*>[^<]*?)\d+(:\d+</a>)")
+VERSIONS_PAGE = (
+    '<select name="version"><option value="WEB">World English Bible (WEB)</option>'
+    '<option value="KJV">King James Version (KJV)</option></select>'
+)
+
+
+def load_fixtures(directory=FIXTURE_DIR):
+    pages = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".html"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as handle:
+                pages[name[:-5]] = handle.read()
+    return pages
+
+
+def relabel(page, chapter):
+    page = VERSE_CLASS_RE.sub(lambda m: f"{m.group(1)}{chapter}{m.group(2)}", page)
+    page = FOOTNOTE_REF_RE.sub(lambda m: f"{m.group(1)}{chapter}{m.group(2)}", page)
+    page = page.replace("#fen-", f"#fen{chapter}-").replace('"fen-', f'"fen{chapter}-')
+    return CHAPTERNUM_RE.sub(lambda m: f"{m.group(1)}{chapter}", page)
+
+
+def passage_inner(page):
+    start, end = bg2obs.find_div_region(page, bg2obs.PASSAGE_START_RE)
+    open_end = page.index(">", start) + 1
+    return page[start:open_end], page[open_end:end - len("</div>")], (start, end)
+
+
+class StandIn:
+    """Pick and assemble the page for a search term."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.names = sorted(pages)
+
+    def page_for(self, search):
+        match = SEARCH_RE.match(search.replace(" ", ""))
+        if not match:
+            return None
+        book, first = match.group(1), int(match.group(2))
+        last = int(match.group(3) or first)
+        chapters = [
+            relabel(self.pages[self.names[zlib.crc32(f"{book}{chapter}".encode()) % len(self.names)]], chapter)
+            for chapter in range(first, last + 1)
+        ]
+        if len(chapters) == 1:
+            return chapters[0]
+        open_tag, _, (start, end) = passage_inner(chapters[0])
+        inner = "".join(passage_inner(page)[1] for page in chapters)
+        return chapters[0][:start] + open_tag + inner + "</div>" + chapters[0][end:]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        body = None
+        if url.path.rstrip("/") == "/passage":
+            body = server.stand_in.page_for(query.get("search", ""))
+        elif url.path.rstrip("/") == "/versions":
+            body = VERSIONS_PAGE
+
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        with server.lock:
+            server.requests += 1
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with server.lock:
+            server.bytes_sent += len(data)
+
+
+def start_server(port=0, latency=0.0, jitter=0.0, fixture_dir=FIXTURE_DIR):
+    """Serve the fixtures on a background thread; latency and jitter are in seconds."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.stand_in = StandIn(load_fixtures(fixture_dir))
+    server.latency = latency
+    server.jitter = jitter
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.bytes_sent = 0
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the benchmark fixtures like BibleGateway.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="added delay per request in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- variation of the delay in ms")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency / 1000, args.jitter / 1000, args.fixtures)
+    print(f"Serving {args.fixtures} on {server.base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
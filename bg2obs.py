@@ -1,12 +1,37 @@
 #!/usr/bin/env python3
 import argparse
+import array
+import base64
+import bisect
+import codecs
+import email.utils
+import functools
+import gzip
+import hashlib
 import html
+import http.client
+import io
+import json
+import math
+import mmap
 import os
+import random
 import re
+import socket
+import sqlite3
+import ssl
 import sys
+import tarfile
+import threading
 import time
+import urllib.error
 import urllib.parse
 import urllib.request
+import xml.etree.ElementTree as ElementTree
+import zipfile
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from html.parser import HTMLParser
 
 
@@ -17,6 +42,254 @@ BOOK_CHAPTERS = [
     5, 5, 3, 5, 1, 1, 1, 22,
 ]
 
+# OSIS and USFM identifiers of the 66 books, in the order of BOOK_CHAPTERS.
+BOOK_IDS = [
+    "Gen", "Exod", "Lev", "Num", "Deut", "Josh", "Judg", "Ruth", "1Sam", "2Sam", "1Kgs", "2Kgs",
+    "1Chr", "2Chr", "Ezra", "Neh", "Esth", "Job", "Ps", "Prov", "Eccl", "Song", "Isa", "Jer", "Lam",
+    "Ezek", "Dan", "Hos", "Joel", "Amos", "Obad", "Jonah", "Mic", "Nah", "Hab", "Zeph", "Hag", "Zech",
+    "Mal", "Matt", "Mark", "Luke", "John", "Acts", "Rom", "1Cor", "2Cor", "Gal", "Eph", "Phil", "Col",
+    "1Thess", "2Thess", "1Tim", "2Tim", "Titus", "Phlm", "Heb", "Jas", "1Pet", "2Pet", "1John",
+    "2John", "3John", "Jude", "Rev",
+]
+USFM_BOOK_IDS = [
+    "GEN", "EXO", "LEV", "NUM", "DEU", "JOS", "JDG", "RUT", "1SA", "2SA", "1KI", "2KI", "1CH", "2CH",
+    "EZR", "NEH", "EST", "JOB", "PSA", "PRO", "ECC", "SNG", "ISA", "JER", "LAM", "EZK", "DAN", "HOS",
+    "JOL", "AMO", "OBA", "JON", "MIC", "NAM", "HAB", "ZEP", "HAG", "ZEC", "MAL", "MAT", "MRK", "LUK",
+    "JHN", "ACT", "ROM", "1CO", "2CO", "GAL", "EPH", "PHP", "COL", "1TH", "2TH", "1TI", "2TI", "TIT",
+    "PHM", "HEB", "JAS", "1PE", "2PE", "1JN", "2JN", "3JN", "JUD", "REV",
+]
+# English names BibleGateway is searched with, whatever locale the vault is written in.
+BOOK_SEARCH_NAMES = [
+    "Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy", "Joshua", "Judges", "Ruth", "1 Samuel",
+    "2 Samuel", "1 Kings", "2 Kings", "1 Chronicles", "2 Chronicles", "Ezra", "Nehemiah", "Esther", "Job",
+    "Psalms", "Proverbs", "Ecclesiastes", "Song of Solomon", "Isaiah", "Jeremiah", "Lamentations", "Ezekiel",
+    "Daniel", "Hosea", "Joel", "Amos", "Obadiah", "Jonah", "Micah", "Nahum", "Habakkuk", "Zephaniah", "Haggai",
+    "Zechariah", "Malachi", "Matthew", "Mark", "Luke", "John", "Acts", "Romans", "1 Corinthians",
+    "2 Corinthians", "Galatians", "Ephesians", "Philippians", "Colossians", "1 Thessalonians",
+    "2 Thessalonians", "1 Timothy", "2 Timothy", "Titus", "Philemon", "Hebrews", "James", "1 Peter", "2 Peter",
+    "1 John", "2 John", "3 John", "Jude", "Revelation",
+]
+
+# Verses in every chapter, book by book in the order of BOOK_CHAPTERS, as the KJV numbers them.
+VERSE_COUNTS = [
+    # Genesis
+    [
+        31, 25, 24, 26, 32, 22, 24, 22, 29, 32, 32, 20, 18, 24, 21, 16, 27, 33, 38, 18, 34, 24, 20, 67, 34,
+        35, 46, 22, 35, 43, 55, 32, 20, 31, 29, 43, 36, 30, 23, 23, 57, 38, 34, 34, 28, 34, 31, 22, 33, 26,
+    ],
+    # Exodus
+    [
+        22, 25, 22, 31, 23, 30, 25, 32, 35, 29, 10, 51, 22, 31, 27, 36, 16, 27, 25, 26, 36, 31, 33, 18, 40,
+        37, 21, 43, 46, 38, 18, 35, 23, 35, 35, 38, 29, 31, 43, 38,
+    ],
+    # Leviticus
+    [
+        17, 16, 17, 35, 19, 30, 38, 36, 24, 20, 47, 8, 59, 57, 33, 34, 16, 30, 37, 27, 24, 33, 44, 23, 55,
+        46, 34,
+    ],
+    # Numbers
+    [
+        54, 34, 51, 49, 31, 27, 89, 26, 23, 36, 35, 16, 33, 45, 41, 50, 13, 32, 22, 29, 35, 41, 30, 25, 18,
+        65, 23, 31, 40, 16, 54, 42, 56, 29, 34, 13,
+    ],
+    # Deuteronomy
+    [
+        46, 37, 29, 49, 33, 25, 26, 20, 29, 22, 32, 32, 18, 29, 23, 22, 20, 22, 21, 20, 23, 30, 25, 22, 19,
+        19, 26, 68, 29, 20, 30, 52, 29, 12,
+    ],
+    # Joshua
+    [18, 24, 17, 24, 15, 27, 26, 35, 27, 43, 23, 24, 33, 15, 63, 10, 18, 28, 51, 9, 45, 34, 16, 33],
+    # Judges
+    [36, 23, 31, 24, 31, 40, 25, 35, 57, 18, 40, 15, 25, 20, 20, 31, 13, 31, 30, 48, 25],
+    # Ruth
+    [22, 23, 18, 22],
+    # 1 Samuel
+    [
+        28, 36, 21, 22, 12, 21, 17, 22, 27, 27, 15, 25, 23, 52, 35, 23, 58, 30, 24, 42, 15, 23, 29, 22, 44,
+        25, 12, 25, 11, 31, 13,
+    ],
+    # 2 Samuel
+    [27, 32, 39, 12, 25, 23, 29, 18, 13, 19, 27, 31, 39, 33, 37, 23, 29, 33, 43, 26, 22, 51, 39, 25],
+    # 1 Kings
+    [53, 46, 28, 34, 18, 38, 51, 66, 28, 29, 43, 33, 34, 31, 34, 34, 24, 46, 21, 43, 29, 53],
+    # 2 Kings
+    [18, 25, 27, 44, 27, 33, 20, 29, 37, 36, 21, 21, 25, 29, 38, 20, 41, 37, 37, 21, 26, 20, 37, 20, 30],
+    # 1 Chronicles
+    [
+        54, 55, 24, 43, 26, 81, 40, 40, 44, 14, 47, 40, 14, 17, 29, 43, 27, 17, 19, 8, 30, 19, 32, 31, 31,
+        32, 34, 21, 30,
+    ],
+    # 2 Chronicles
+    [
+        17, 18, 17, 22, 14, 42, 22, 18, 31, 19, 23, 16, 22, 15, 19, 14, 19, 34, 11, 37, 20, 12, 21, 27, 28,
+        23, 9, 27, 36, 27, 21, 33, 25, 33, 27, 23,
+    ],
+    # Ezra
+    [11, 70, 13, 24, 17, 22, 28, 36, 15, 44],
+    # Nehemiah
+    [11, 20, 32, 23, 19, 19, 73, 18, 38, 39, 36, 47, 31],
+    # Esther
+    [22, 23, 15, 17, 14, 14, 10, 17, 32, 3],
+    # Job
+    [
+        22, 13, 26, 21, 27, 30, 21, 22, 35, 22, 20, 25, 28, 22, 35, 22, 16, 21, 29, 29, 34, 30, 17, 25, 6,
+        14, 23, 28, 25, 31, 40, 22, 33, 37, 16, 33, 24, 41, 30, 24, 34, 17,
+    ],
+    # Psalms
+    [
+        6, 12, 8, 8, 12, 10, 17, 9, 20, 18, 7, 8, 6, 7, 5, 11, 15, 50, 14, 9, 13, 31, 6, 10, 22, 12, 14, 9,
+        11, 12, 24, 11, 22, 22, 28, 12, 40, 22, 13, 17, 13, 11, 5, 26, 17, 11, 9, 14, 20, 23, 19, 9, 6, 7,
+        23, 13, 11, 11, 17, 12, 8, 12, 11, 10, 13, 20, 7, 35, 36, 5, 24, 20, 28, 23, 10, 12, 20, 72, 13, 19,
+        16, 8, 18, 12, 13, 17, 7, 18, 52, 17, 16, 15, 5, 23, 11, 13, 12, 9, 9, 5, 8, 28, 22, 35, 45, 48, 43,
+        13, 31, 7, 10, 10, 9, 8, 18, 19, 2, 29, 176, 7, 8, 9, 4, 8, 5, 6, 5, 6, 8, 8, 3, 18, 3, 3, 21, 26, 9,
+        8, 24, 13, 10, 7, 12, 15, 21, 10, 20, 14, 9, 6,
+    ],
+    # Proverbs
+    [
+        33, 22, 35, 27, 23, 35, 27, 36, 18, 32, 31, 28, 25, 35, 33, 33, 28, 24, 29, 30, 31, 29, 35, 34, 28,
+        28, 27, 28, 27, 33, 31,
+    ],
+    # Ecclesiastes
+    [18, 26, 22, 16, 20, 12, 29, 17, 18, 20, 10, 14],
+    # Song of Solomon
+    [17, 17, 11, 16, 16, 13, 13, 14],
+    # Isaiah
+    [
+        31, 22, 26, 6, 30, 13, 25, 22, 21, 34, 16, 6, 22, 32, 9, 14, 14, 7, 25, 6, 17, 25, 18, 23, 12, 21,
+        13, 29, 24, 33, 9, 20, 24, 17, 10, 22, 38, 22, 8, 31, 29, 25, 28, 28, 25, 13, 15, 22, 26, 11, 23, 15,
+        12, 17, 13, 12, 21, 14, 21, 22, 11, 12, 19, 12, 25, 24,
+    ],
+    # Jeremiah
+    [
+        19, 37, 25, 31, 31, 30, 34, 22, 26, 25, 23, 17, 27, 22, 21, 21, 27, 23, 15, 18, 14, 30, 40, 10, 38,
+        24, 22, 17, 32, 24, 40, 44, 26, 22, 19, 32, 21, 28, 18, 16, 18, 22, 13, 30, 5, 28, 7, 47, 39, 46, 64,
+        34,
+    ],
+    # Lamentations
+    [22, 22, 66, 22, 22],
+    # Ezekiel
+    [
+        28, 10, 27, 17, 17, 14, 27, 18, 11, 22, 25, 28, 23, 23, 8, 63, 24, 32, 14, 49, 32, 31, 49, 27, 17,
+        21, 36, 26, 21, 26, 18, 32, 33, 31, 15, 38, 28, 23, 29, 49, 26, 20, 27, 31, 25, 24, 23, 35,
+    ],
+    # Daniel
+    [21, 49, 30, 37, 31, 28, 28, 27, 27, 21, 45, 13],
+    # Hosea
+    [11, 23, 5, 19, 15, 11, 16, 14, 17, 15, 12, 14, 16, 9],
+    # Joel
+    [20, 32, 21],
+    # Amos
+    [15, 16, 15, 13, 27, 14, 17, 14, 15],
+    # Obadiah
+    [21],
+    # Jonah
+    [17, 10, 10, 11],
+    # Micah
+    [16, 13, 12, 13, 15, 16, 20],
+    # Nahum
+    [15, 13, 19],
+    # Habakkuk
+    [17, 20, 19],
+    # Zephaniah
+    [18, 15, 20],
+    # Haggai
+    [15, 23],
+    # Zechariah
+    [21, 13, 10, 14, 11, 15, 14, 23, 17, 12, 17, 14, 9, 21],
+    # Malachi
+    [14, 17, 18, 6],
+    # Matthew
+    [
+        25, 23, 17, 25, 48, 34, 29, 34, 38, 42, 30, 50, 58, 36, 39, 28, 27, 35, 30, 34, 46, 46, 39, 51, 46,
+        75, 66, 20,
+    ],
+    # Mark
+    [45, 28, 35, 41, 43, 56, 37, 38, 50, 52, 33, 44, 37, 72, 47, 20],
+    # Luke
+    [80, 52, 38, 44, 39, 49, 50, 56, 62, 42, 54, 59, 35, 35, 32, 31, 37, 43, 48, 47, 38, 71, 56, 53],
+    # John
+    [51, 25, 36, 54, 47, 71, 53, 59, 41, 42, 57, 50, 38, 31, 27, 33, 26, 40, 42, 31, 25],
+    # Acts
+    [
+        26, 47, 26, 37, 42, 15, 60, 40, 43, 48, 30, 25, 52, 28, 41, 40, 34, 28, 41, 38, 40, 30, 35, 27, 27,
+        32, 44, 31,
+    ],
+    # Romans
+    [32, 29, 31, 25, 21, 23, 25, 39, 33, 21, 36, 21, 14, 23, 33, 27],
+    # 1 Corinthians
+    [31, 16, 23, 21, 13, 20, 40, 13, 27, 33, 34, 31, 13, 40, 58, 24],
+    # 2 Corinthians
+    [24, 17, 18, 18, 21, 18, 16, 24, 15, 18, 33, 21, 14],
+    # Galatians
+    [24, 21, 29, 31, 26, 18],
+    # Ephesians
+    [23, 22, 21, 32, 33, 24],
+    # Philippians
+    [30, 30, 21, 23],
+    # Colossians
+    [29, 23, 25, 18],
+    # 1 Thessalonians
+    [10, 20, 13, 18, 28],
+    # 2 Thessalonians
+    [12, 17, 18],
+    # 1 Timothy
+    [20, 15, 16, 16, 25, 21],
+    # 2 Timothy
+    [18, 26, 17, 22],
+    # Titus
+    [16, 15, 15],
+    # Philemon
+    [25],
+    # Hebrews
+    [14, 18, 19, 16, 14, 20, 28, 13, 28, 39, 40, 29, 25],
+    # James
+    [27, 26, 18, 17, 20],
+    # 1 Peter
+    [25, 25, 22, 19, 14],
+    # 2 Peter
+    [21, 22, 18],
+    # 1 John
+    [10, 29, 24, 21, 21],
+    # 2 John
+    [13],
+    # 3 John
+    [14],
+    # Jude
+    [25],
+    # Revelation
+    [20, 29, 22, 11, 14, 17, 17, 13, 21, 11, 19, 17, 18, 20, 8, 21, 18, 24, 21, 15, 27, 21],
+]
+# Verses critical-text translations leave out of the text, keyed by OSIS chapter.
+CRITICAL_TEXT_OMISSIONS = {
+    "Matt.17": (21,), "Matt.18": (11,), "Matt.23": (14,), "Mark.7": (16,), "Mark.9": (44, 46), "Mark.11": (26,),
+    "Mark.15": (28,), "Luke.17": (36,), "Luke.23": (17,), "John.5": (4,), "Acts.8": (37,), "Acts.15": (34,),
+    "Acts.24": (7,), "Acts.28": (29,), "Rom.16": (24,),
+}
+# Psalms whose title is numbered as verse 1 (verses 1 and 2 for four of them), as in the Hebrew text.
+NUMBERED_PSALM_TITLES = {
+    3: 1, 4: 1, 5: 1, 6: 1, 7: 1, 8: 1, 9: 1, 12: 1, 18: 1, 19: 1, 20: 1, 21: 1, 22: 1, 30: 1, 31: 1, 34: 1, 36: 1,
+    38: 1, 39: 1, 40: 1, 41: 1, 42: 1, 44: 1, 45: 1, 46: 1, 47: 1, 48: 1, 49: 1, 51: 2, 52: 2, 53: 1, 54: 2, 55: 1,
+    56: 1, 57: 1, 58: 1, 59: 1, 60: 2, 61: 1, 62: 1, 63: 1, 64: 1, 65: 1, 67: 1, 68: 1, 69: 1, 70: 1, 75: 1, 76: 1,
+    77: 1, 80: 1, 81: 1, 83: 1, 84: 1, 85: 1, 88: 1, 89: 1, 92: 1, 102: 1, 108: 1, 140: 1, 142: 1,
+}
+# How a version numbers verses: "counts" overrides VERSE_COUNTS and "omitted" lists verses left out.
+KJV_VERSIFICATION = {"counts": {}, "omitted": {}}
+MODERN_VERSIFICATION = {"counts": {"3John.1": 15, "Rev.12": 18}, "omitted": CRITICAL_TEXT_OMISSIONS}
+PSALM_TITLE_VERSIFICATION = {
+    "counts": {f"Ps.{psalm}": VERSE_COUNTS[18][psalm - 1] + extra for psalm, extra in NUMBERED_PSALM_TITLES.items()},
+    "omitted": {},
+}
+VERSIFICATION = {
+    **{version: KJV_VERSIFICATION for version in ("AKJV", "ASV", "DARBY", "KJ21", "KJV", "NKJV", "WEB", "YLT")},
+    **{
+        version: MODERN_VERSIFICATION
+        for version in ("CSB", "ESV", "NET", "NIV", "NLT", "NRSVUE", "NTV", "NVI", "RSV")
+    },
+    **{version: PSALM_TITLE_VERSIFICATION for version in ("LUTH1545", "SCH1951", "SCH2000")},
+}
+# Versions missing from VERSIFICATION may leave out the CRITICAL_TEXT_OMISSIONS.
+UNKNOWN_VERSIFICATION = {"counts": {}, "omitted": CRITICAL_TEXT_OMISSIONS}
+
 PASSAGE_CLASSES = {"passage-text"}
 FOOTNOTE_CONTAINER_CLASSES = {"footnotes"}
 FOOTNOTE_CONTAINER_IDS = {"footnotes"}
@@ -37,12 +310,35 @@ IGNORE_CLASSES = {
     "passage-display",
 }
 SKIP_TAGS = {"script", "style", "noscript"}
+VERSE_CLASS_RE = re.compile(r"^\w+-(\d+)-(\d+)$")
+DIV_SCAN_RE = re.compile(
+    r"<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->|<(/?)div\b[^>]*>",
+    re.IGNORECASE | re.DOTALL,
+)
 BSB_VERSION = "BSB"
+# Bump when the chapter model or its stored rows change.
+MODEL_FORMAT = 3
+DEFAULT_STORE = "bible.sqlite"
+DEFAULT_SEARCH_LIMIT = 50
+DEFAULT_RATE = 5.0
+DEFAULT_RETRIES = 4
+MIN_RATE = 0.2
+RATE_STEP = 0.1
+SLOW_RESPONSE = 2.0
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 60.0
+MAX_RETRY_AFTER = 300.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+STREAM_CHUNK = 4096
+# Bytes still read after a --stream stop so the connection can be reused.
+STREAM_DRAIN = 32768
+BASE_URL = "https://www.biblegateway.com"
+USER_AGENT = "bg2obs.py (https://github.com/selfire1/BibleGateway-to-Obsidian)"
 
 
 def show_help():
-    print("Usage: bg2obs.py [-sbeaicyh] [-v version] [-l language] [--book BOOK] [--chapter N] [--list-versions] [--footnotes] [--abbr]")
-    print("  -v version   Specify the Bible version to download (default = WEB)")
+    print("Usage: bg2obs.py [-sbeaicyh] [-v version] [-l language] [--book BOOK] [--chapter N] [--list-versions] [--footnotes] [--abbr] [--resume] [--batch-chapters N] [--jobs N] [--workers N] [--rate R] [--retries N] [--cache-dir DIR] [--offline] [--refresh] [--metrics FILE] [--variant FLAGS:NAME] [--store FILE] [--source PATH] [--parallel] [--fsync POLICY] [--output-archive FILE] [--stream] [--shard I/N] [--parser ENGINE] [--verse-check MODE]")
+    print("  -v version   Specify the Bible version to download, or several as WEB,KJV (default = WEB, or the --source file name)")
     print("  -s           If available, use shorter book abbreviations")
     print("  -b           Set words of Jesus in bold")
     print("  -e           Include editorial headers")
@@ -50,21 +346,52 @@ def show_help():
     print("  -i           Show download information (i.e. verbose mode)")
     print("  -c           Include inline navigation for the breadcrumbs plugin (e.g. 'up', 'next','previous')")
     print("  -y           Print navigation for the breadcrumbs plugin in the frontmatter (YAML)")
-    print("  -l           Which language to use for file names, links, and titles")
+    print("  -l           Which language to use for file names, links, and titles (e.g. en,de to write one vault per language)")
     print("  --book       Limit download to a single book (use locale spelling or abbreviation)")
     print("  --chapter    Limit download to a single chapter (requires --book)")
     print("  --list-versions  List available version abbreviations from BibleGateway")
     print("  --footnotes  Include footnotes in the text and footer")
     print("  --abbr       Use medium-length abbreviations for filenames (booksAbbr.txt)")
+    print("  --cache-dir DIR  Keep downloaded pages in DIR and reuse them on later runs")
+    print("  --cache-ttl DAYS Re-download cached pages older than DAYS")
+    print("  --cache-max-size MB  Evict least recently used pages beyond MB megabytes")
+    print("  --offline    Only use pages from --cache-dir, never the network")
+    print("  --refresh    Re-download every page and update --cache-dir")
+    print("  --base-url   Site to download from (default = https://www.biblegateway.com)")
+    print("  --resume     Only download chapters that are missing or were rendered with other options")
+    print("  --batch-chapters N  Request up to N consecutive chapters per page and split them locally")
+    print("  --jobs N     Number of chapters to download in parallel (default = 1)")
+    print("  --workers N  Number of processes that parse and render chapters (default = 1)")
+    print(f"  --rate R     Maximum requests per second across all downloads (default = {DEFAULT_RATE:g})")
+    print(f"  --retries N  Retry a failed download up to N times with backoff (default = {DEFAULT_RETRIES})")
+    print("  --metrics FILE  Write per-chapter stage timings and a summary to FILE as JSON")
+    print("  --source PATH  Build the vault from a local TSV, USFM or OSIS file (or a folder of USFM files)")
+    print(f"  --source-format FMT  Format of --source when its extension does not tell ({', '.join(SOURCE_FORMATS)})")
+    print("  --store FILE Keep every parsed chapter in a SQLite database (also used instead of downloading)")
+    print("  --variant FLAGS:NAME  Also write a vault named NAME with the flags in FLAGS (from 'beacyf', f = footnotes)")
+    print("  --parallel   With several versions, also write a vault with the versions side by side in each chapter")
+    print("  --fsync POLICY  When to force written files to disk: none, end (once, after the run) or always (default = none)")
+    print("  --output-archive FILE  Write the vaults into FILE (.zip, .tar.gz or .tar) instead of folders")
+    print(f"  --stream     Stop each download once the passage has arrived; a rest over {STREAM_DRAIN // 1024} KB closes the connection (new handshake), and parsing still waits for the stop")
+    print("  --shard I/N  Only build part I of N (runs of chapters with about equal verse counts); finish with `bg2obs.py merge`")
+    print("  --parser ENGINE  Page parser: html (Python's html.parser) or fast (a regex tokenizer, same output) (default = html)")
+    print("  --verse-check MODE  Check verse counts: refetch cut-off or gapped chapters, report only, or off (default = refetch)")
     print("  -h           Display help")
+    print("Search:  bg2obs.py search QUERY [-v version] [-l language] [--store FILE] [--limit N]")
+    print(f"  Find verses in a --store database (default = {DEFAULT_STORE}); QUERY uses SQLite FTS5 syntax")
+    print("Merge:   bg2obs.py merge [FOLDER] [--fsync POLICY]")
+    print("  Write the indexes and book overviews once every --shard I/N run has finished in FOLDER")
 
 
 class BibleGatewayParser(HTMLParser):
-    def __init__(self, include_headers, bold_words, include_footnotes):
+    """Turn a passage into (kind, value) chapter model events for render_events()."""
+
+    def __init__(self, include_footnotes, track_chapters=False):
         super().__init__()
-        self.include_headers = include_headers
-        self.bold_words = bold_words
         self.include_footnotes = include_footnotes
+        self.track_chapters = track_chapters
+        self.current_chapter = None
+        self.chapter_marks = []
         self.passage_depth = 0
         self.skip_depth = 0
         self.woj_depth = 0
@@ -80,7 +407,7 @@ class BibleGatewayParser(HTMLParser):
         self.footnote_ref_id = None
         self.footnote_ref_map = {}
         self.used_labels = set()
-        self.out = []
+        self.events = []
 
     def _classes(self, attrs):
         for k, v in attrs:
@@ -96,7 +423,10 @@ class BibleGatewayParser(HTMLParser):
 
     def _append(self, text):
         if text:
-            self.out.append(text)
+            self.events.append(("text", text))
+
+    def _emit(self, kind, value):
+        self.events.append((kind, value))
 
     def handle_starttag(self, tag, attrs):
         classes = self._classes(attrs)
@@ -120,6 +450,9 @@ class BibleGatewayParser(HTMLParser):
             self.skip_depth = 1
             return
 
+        if self.track_chapters:
+            self._track_chapter(classes)
+
         if self.woj_depth > 0:
             self.woj_depth += 1
 
@@ -151,9 +484,9 @@ class BibleGatewayParser(HTMLParser):
                     break
             return
 
-        if self.bold_words and "woj" in classes:
+        if "woj" in classes:
             self.woj_depth = 1
-            self._append("**")
+            self._emit("woj", "open")
 
         if tag == "br":
             self._append("\n")
@@ -173,10 +506,9 @@ class BibleGatewayParser(HTMLParser):
 
         if self.in_heading and tag in {"h1", "h2", "h3", "h4", "h5", "h6"}:
             self.in_heading = False
-            if self.include_headers:
-                heading = "".join(self.heading_buf).strip()
-                if heading:
-                    self._append("\n\n##### " + heading + "\n")
+            heading = "".join(self.heading_buf).strip()
+            if heading:
+                self._emit("heading", heading)
             self.passage_depth -= 1
             return
 
@@ -186,14 +518,14 @@ class BibleGatewayParser(HTMLParser):
             if num and self.skip_next_versenum == num:
                 self.skip_next_versenum = None
             elif num:
-                self._append("\n\n###### " + num + "\n")
+                self._emit("verse", num)
             self.passage_depth -= 1
             return
 
         if self.in_chapternum and tag in {"sup", "span"}:
             self.in_chapternum = False
             num = "1"
-            self._append("\n\n###### " + num + "\n")
+            self._emit("verse", num)
             self.skip_next_versenum = num
             self.passage_depth -= 1
             return
@@ -205,7 +537,7 @@ class BibleGatewayParser(HTMLParser):
             label = self._register_label(label)
             if self.footnote_ref_id:
                 self.footnote_ref_map[self.footnote_ref_id] = label
-            self._append(f"[^{label}]")
+            self._emit("note", label)
             self.footnote_ref_buf = []
             self.footnote_ref_id = None
             self.passage_depth -= 1
@@ -213,8 +545,8 @@ class BibleGatewayParser(HTMLParser):
 
         if self.woj_depth > 0:
             self.woj_depth -= 1
-            if self.woj_depth == 0 and self.bold_words:
-                self._append("**")
+            if self.woj_depth == 0:
+                self._emit("woj", "close")
 
         if tag == "p":
             self._append("\n\n")
@@ -243,6 +575,24 @@ class BibleGatewayParser(HTMLParser):
 
         self._append(data)
 
+    def _track_chapter(self, classes):
+        for name in classes:
+            match = VERSE_CLASS_RE.match(name)
+            if match:
+                chapter = int(match.group(1))
+                if chapter != self.current_chapter:
+                    self.current_chapter = chapter
+                    position = len(self.events)
+                    while self.chapter_marks and position and self._opens_chapter(self.events[position - 1]):
+                        position -= 1
+                    self.chapter_marks.append((position, chapter))
+                return
+
+    @staticmethod
+    def _opens_chapter(event):
+        kind, value = event
+        return kind == "heading" or (kind == "text" and not value.strip())
+
     def _register_label(self, label):
         if not label:
             label = str(len(self.used_labels) + 1)
@@ -359,90 +709,1837 @@ class FootnoteParser(HTMLParser):
                 self.note_buf.append(data)
 
 
+class PassageParser(HTMLParser):
+    """Tokenize a passage page once and drive the body and footnote parsers from it."""
+
+    def __init__(self, include_footnotes, track_chapters=False):
+        super().__init__()
+        self.body = BibleGatewayParser(include_footnotes=include_footnotes, track_chapters=track_chapters)
+        self.notes = FootnoteParser() if include_footnotes else None
+        if self.notes is None:
+            self.handle_starttag = self.body.handle_starttag
+            self.handle_startendtag = self.body.handle_startendtag
+            self.handle_endtag = self.body.handle_endtag
+            self.handle_data = self.body.handle_data
+
+    def handle_starttag(self, tag, attrs):
+        self.body.handle_starttag(tag, attrs)
+        self.notes.handle_starttag(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.body.handle_startendtag(tag, attrs)
+        self.notes.handle_startendtag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self.body.handle_endtag(tag)
+        self.notes.handle_endtag(tag)
+
+    def handle_data(self, data):
+        self.body.handle_data(data)
+        self.notes.handle_data(data)
+
+
+# --parser fast: start tags, end tags, comments and doctypes; any other "<" sends the page to HTMLParser.
+FAST_TOKEN_RE = re.compile(
+    r"<(?:([a-zA-Z][a-zA-Z0-9]*)((?:[ \t\n\r\f][^<>]*?)?)[ \t\n\r\f]*(/?)>"
+    r"|/([a-zA-Z][a-zA-Z0-9]*)[ \t\n\r\f]*>"
+    r"|!--(?!-?>)(.*?)-->"
+    r"|![a-zA-Z][^>]*>)"
+    r"|<",
+    re.DOTALL,
+)
+FAST_ATTR_RE = re.compile(
+    r"[ \t\n\r\f]+([a-zA-Z_:][-a-zA-Z0-9_:.]*)"
+    r"(?:[ \t\n\r\f]*=[ \t\n\r\f]*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'=<>`/]+)))?"
+)
+FAST_ATTRS_RE = re.compile(f"(?:{FAST_ATTR_RE.pattern})*[ \t\n\r\f]*")
+FAST_ATTR_NAMES = {"class", "id", "data-fn"}
+FAST_RAW_TEXT_RE = {
+    tag: (re.compile(f"</{tag}", re.IGNORECASE), re.compile(rf"</\s+{tag}", re.IGNORECASE))
+    for tag in HTMLParser.CDATA_CONTENT_ELEMENTS
+}
+
+
+class FastPassageParser:
+    """PassageParser on the FAST_TOKEN_RE tokenizer; pages it cannot tokenize go to HTMLParser."""
+
+    def __init__(self, include_footnotes, track_chapters=False):
+        self.include_footnotes = include_footnotes
+        self.track_chapters = track_chapters
+        self.parts = []
+        self.body = None
+        self.notes = None
+        self.fell_back = False
+
+    def feed(self, data):
+        self.parts.append(data)
+
+    def close(self):
+        text = "".join(self.parts)
+        self.parts = []
+        parser = PassageParser(self.include_footnotes, self.track_chapters)
+        if not self._tokenize(text, parser):
+            self.fell_back = True
+            parser = PassageParser(self.include_footnotes, self.track_chapters)
+            parser.feed(text)
+            parser.close()
+        self.body = parser.body
+        self.notes = parser.notes
+
+    def _tokenize(self, text, parser):
+        """Send `text` to the parser's handlers; return False at markup outside the fast subset."""
+        handle_starttag = parser.handle_starttag
+        handle_startendtag = parser.handle_startendtag
+        handle_endtag = parser.handle_endtag
+        handle_data = parser.handle_data
+        unescape = html.unescape
+        position = 0
+        while True:
+            for match in FAST_TOKEN_RE.finditer(text, position):
+                start = match.start()
+                if start > position:
+                    data = text[position:start]
+                    handle_data(unescape(data) if "&" in data else data)
+                position = match.end()
+                tag, attr_text, self_closing, end_tag, comment = match.groups()
+                if end_tag is not None:
+                    handle_endtag(end_tag.lower())
+                elif tag is not None:
+                    attrs = _fast_attrs(attr_text, self_closing) if attr_text else ()
+                    if attrs is None:
+                        return False
+                    tag = tag.lower()
+                    if self_closing:
+                        handle_startendtag(tag, attrs)
+                        continue
+                    handle_starttag(tag, attrs)
+                    if tag in FAST_RAW_TEXT_RE:
+                        break
+                elif comment is not None:
+                    if "--" in comment:
+                        return False
+                elif match.group(0) == "<":
+                    return False
+            else:
+                break
+            close_re, spaced_close_re = FAST_RAW_TEXT_RE[tag]
+            close = close_re.search(text, position)
+            if close is None or text[close.end():close.end() + 1] != ">":
+                return False
+            if spaced_close_re.search(text, position, close.start()):
+                return False
+            if close.start() > position:
+                handle_data(text[position:close.start()])
+            handle_endtag(tag)
+            position = close.end() + 1
+        if position < len(text):
+            data = text[position:]
+            handle_data(unescape(data) if "&" in data else data)
+        return True
+
+
+@functools.lru_cache(maxsize=4096)
+def _fast_attrs(attr_text, self_closing):
+    """Return the (name, value) attributes the handlers read, or None for text outside the fast subset."""
+    # HTMLParser reads "a=b/>" as the value "b/", not as a self-closing tag.
+    if not FAST_ATTRS_RE.fullmatch(attr_text) or (self_closing and attr_text[-1] not in "\"' \t\n\r\f"):
+        return None
+    attrs = []
+    for attr in FAST_ATTR_RE.finditer(attr_text):
+        name = attr.group(1).lower()
+        if name not in FAST_ATTR_NAMES:
+            continue
+        double, single, bare = attr.group(2, 3, 4)
+        value = double if double is not None else single if single is not None else bare
+        if value and "&" in value:
+            value = html.unescape(value)
+        attrs.append((name, value))
+    return tuple(attrs)
+
+TRAILING_SPACE_RE = re.compile(r"[ \t]+\n")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+SPACE_RUN_RE = re.compile(r"[ \t]{2,}")
+
+
 def normalize_markdown(text):
-    text = html.unescape(text)
+    if "&" in text:
+        text = html.unescape(text)
     text = text.replace("\u00a0", " ")
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    text = re.sub(r"[ \t]+\n", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = re.sub(r"[ \t]{2,}", " ", text)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if " \n" in text or "\t" in text:
+        text = TRAILING_SPACE_RE.sub("\n", text)
+    if "\n\n\n" in text:
+        text = BLANK_LINES_RE.sub("\n\n", text)
+    if "  " in text or "\t" in text:
+        text = SPACE_RUN_RE.sub(" ", text)
     return text.strip()
 
 
-def fetch_passage(book, chapter, version):
+class HTTPTransport:
+    """Pool of keep-alive connections shared by every request in a run."""
+
+    def __init__(self, base_url=BASE_URL, max_idle=8, timeout=30, proxies=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.ssl_context = ssl.create_default_context()
+        self.requests = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def proxy_for(self, scheme, host):
+        """Return the proxy URL to reach host through, or None to connect directly."""
+        proxy = self.proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        return proxy if "://" in proxy else f"http://{proxy}"
+
+    def _connect(self, scheme, host, port, proxy):
+        if proxy:
+            parts = urllib.parse.urlsplit(proxy)
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(
+                    parts.hostname, parts.port or 80, timeout=self.timeout, context=self.ssl_context
+                )
+                conn.set_tunnel(host, port, headers=self._proxy_headers(proxy))
+                return conn
+            return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    @staticmethod
+    def _proxy_headers(proxy):
+        parts = urllib.parse.urlsplit(proxy)
+        if parts.username is None:
+            return {}
+        credentials = f"{urllib.parse.unquote(parts.username)}:{urllib.parse.unquote(parts.password or '')}"
+        return {"Proxy-Authorization": "Basic " + base64.b64encode(credentials.encode()).decode("ascii")}
+
+    def _open(self, conn, proxy, timings):
+        """Connect a new connection by hand so DNS and connect time can be told apart."""
+        start = time.perf_counter()
+        if proxy:
+            conn.connect()
+            add_timing(timings, "connect", time.perf_counter() - start)
+            return
+        addresses = socket.getaddrinfo(conn.host, conn.port, type=socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+        error = None
+        for _, _, _, _, address in addresses:
+            try:
+                sock = socket.create_connection(address[:2], self.timeout)
+                break
+            except OSError as exc:
+                error = exc
+        else:
+            raise error or OSError(f"Could not connect to {conn.host}")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if isinstance(conn, http.client.HTTPSConnection):
+            sock = self.ssl_context.wrap_socket(sock, server_hostname=conn.host)
+        conn.sock = sock
+        if timings is not None:
+            add_timing(timings, "dns", resolved - start)
+            add_timing(timings, "connect", time.perf_counter() - resolved)
+
+    def _checkout(self, key, reuse=True):
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle and reuse:
+                self.connections_reused += 1
+                return idle.pop(), True
+            self.connections_opened += 1
+        return self._connect(*key), False
+
+    def _checkin(self, key, conn):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            pools = list(self.idle.values())
+            self.idle = {}
+        for idle in pools:
+            for conn in idle:
+                conn.close()
+
+    def url(self, path, params=None):
+        url = self.base_url + path
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        return url
+
+    def _read_until(self, resp, until):
+        """Read a response body until until()'s check has seen enough; return (body, finished, received)."""
+        inflate = None
+        if resp.getheader("Content-Encoding", "").lower() == "gzip":
+            inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        arrived = until()
+        chunks = []
+        received = 0
+        while True:
+            chunk = resp.read1(STREAM_CHUNK)
+            if not chunk:
+                # read1() never marks a Content-Length body done; read() does.
+                resp.read()
+                return b"".join(chunks), True, received
+            received += len(chunk)
+            if inflate is not None:
+                chunk = inflate.decompress(chunk)
+            chunks.append(chunk)
+            if arrived(decoder.decode(chunk)):
+                break
+        body = b"".join(chunks)
+        # resp.length is None for a chunked body.
+        if resp.length is not None:
+            if resp.length > STREAM_DRAIN:
+                return body, False, received
+            received += len(resp.read())
+            return body, True, received
+        limit = received + STREAM_DRAIN
+        while received <= limit:
+            chunk = resp.read1(STREAM_CHUNK)
+            if not chunk:
+                return body, True, received
+            received += len(chunk)
+        return body, False, received
+
+    def get(self, url, redirects=5, timings=None, until=None):
+        """Return the (decompressed) body of url; with `until`, stop reading once enough has arrived."""
+        parts = urllib.parse.urlsplit(url)
+        proxy = self.proxy_for(parts.scheme, parts.hostname)
+        key = (parts.scheme, parts.hostname, parts.port, proxy)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"}
+        if proxy and parts.scheme != "https":
+            target = urllib.parse.urlunsplit((parts.scheme, parts.netloc, target, "", ""))
+            headers.update(self._proxy_headers(proxy))
+
+        reuse = True
+        while True:
+            conn, reused = self._checkout(key, reuse)
+            try:
+                if not reused:
+                    self._open(conn, proxy, timings)
+                start = time.perf_counter()
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+                first_byte = time.perf_counter()
+                streamed = until is not None and resp.status == 200
+                if streamed:
+                    body, complete, received = self._read_until(resp, until)
+                else:
+                    body = resp.read()
+                    complete = True
+                    received = len(body)
+                if timings is not None:
+                    add_timing(timings, "ttfb", first_byte - start)
+                    add_timing(timings, "body", time.perf_counter() - first_byte)
+                    add_timing(timings, "bytes", received)
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if reused:
+                    if timings is not None:
+                        add_timing(timings, "retries", 1)
+                    reuse = False
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            break
+
+        with self.lock:
+            self.requests += 1
+        if resp.will_close or not complete:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+
+        if resp.status in {301, 302, 303, 307, 308} and redirects > 0:
+            location = resp.getheader("Location")
+            if location:
+                return self.get(urllib.parse.urljoin(url, location), redirects - 1, timings, until)
+        if resp.status >= 400:
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.msg, None)
+        if not streamed and resp.getheader("Content-Encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+    def get_text(self, path, params=None, timings=None, until=None):
+        return self.get(self.url(path, params), timings=timings, until=until).decode("utf-8", errors="replace")
+
+
+_default_transport = None
+
+
+def default_transport():
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = HTTPTransport()
+    return _default_transport
+
+
+class ResponseCache:
+    """Gzip-compressed raw pages on disk, one file per hashed key; hits and misses count chapters."""
+
+    def __init__(self, directory, ttl=None, max_bytes=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path, _ in self._entries())
+
+    def _path(self, key):
+        digest = hashlib.sha256("\0".join(str(part) for part in key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".gz")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".gz"):
+                    path = os.path.join(root, name)
+                    yield path, os.stat(path)
+
+    def count(self, found, chapters):
+        with self.lock:
+            if found:
+                self.hits += chapters
+            else:
+                self.misses += chapters
+
+    def get(self, key, chapters=1):
+        """Return the cached text for key, or None; chapters=0 leaves the hit or miss uncounted."""
+        path = self._path(key)
+        data = None
+        try:
+            stat = os.stat(path)
+            if self.ttl is None or time.time() - stat.st_mtime <= self.ttl:
+                with open(path, "rb") as handle:
+                    data = gzip.decompress(handle.read())
+                os.utime(path, (time.time(), stat.st_mtime))
+        except (OSError, EOFError):
+            data = None
+        if chapters:
+            self.count(data is not None, chapters)
+        return data.decode("utf-8") if data is not None else None
+
+    def put(self, key, text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = gzip.compress(text.encode("utf-8"))
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(data)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.size += len(data) - old_size
+            over_limit = self.max_bytes is not None and self.size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used pages until the cache is back under 90% of max_bytes."""
+        with self.lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1].st_atime)
+            self.size = sum(stat.st_size for _, stat in entries)
+            target = self.max_bytes * 0.9
+            for path, stat in entries:
+                if self.size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self.size -= stat.st_size
+
+
+def fetch_passage(book, chapter, version, transport=None, timings=None, until=None):
+    transport = transport or default_transport()
     search = f"{book}{chapter}"
     params = {
         "search": search,
         "version": version,
         "print": "yes",
     }
-    url = "https://www.biblegateway.com/passage/?" + urllib.parse.urlencode(params)
-    req = urllib.request.Request(
-        url,
-        headers={"User-Agent": "bg2obs.py (https://github.com/selfire1/BibleGateway-to-Obsidian)"},
-    )
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        return resp.read().decode("utf-8", errors="replace")
+    return transport.get_text("/passage/", params, timings, until)
+
+
+class RateLimiter:
+    """Token bucket shared by every download thread; failures halve the rate."""
+
+    def __init__(self, rate, burst=1, min_rate=MIN_RATE):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def success(self, elapsed):
+        if self.max_rate <= 0 or elapsed > SLOW_RESPONSE:
+            return
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + RATE_STEP)
+
+    def failure(self, retry_after=None):
+        with self.lock:
+            if self.max_rate > 0:
+                self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+def is_retryable(exc):
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code in RETRY_STATUSES
+    return isinstance(exc, (OSError, http.client.HTTPException))
+
+
+def retry_after_seconds(exc):
+    """Return the Retry-After delay of an HTTPError in seconds, or None."""
+    headers = getattr(exc, "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        seconds = float(value)
+    else:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+def fetch_with_retries(fetch, limiter, retries, timings=None):
+    """Call fetch() under the rate limiter, retrying 429s, 5xx responses and network errors."""
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        limiter.acquire()
+        add_timing(timings, "throttle", time.perf_counter() - start)
+        start = time.perf_counter()
+        try:
+            result = fetch()
+        except Exception as exc:
+            if not is_retryable(exc):
+                raise
+            retry_after = retry_after_seconds(exc)
+            limiter.failure(retry_after)
+            if attempt >= retries:
+                raise
+            attempt += 1
+            add_timing(timings, "retries", 1)
+            delay = max(random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt)), retry_after or 0)
+            time.sleep(delay)
+            add_timing(timings, "backoff", delay)
+            continue
+        limiter.success(time.perf_counter() - start)
+        return result
+
+
+def ordered_map(func, items, jobs, executor_class=ThreadPoolExecutor):
+    """Yield func(item) for every item in input order, running up to `jobs` calls at once."""
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pending = deque()
+    executor = executor_class(max_workers=jobs)
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+TIMED_STAGES = (
+    "throttle", "backoff", "cache", "dns", "connect", "ttfb", "body", "parse", "normalize", "cleanup", "render", "write",
+)
+
+
+def add_timing(timings, stage, value):
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0) + value
+
+
+def summarize(values):
+    ordered = sorted(values)
+
+    def percentile(pct):
+        return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+    return {
+        "total": sum(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": ordered[-1],
+    }
+
+
+class RunMetrics:
+    """Per-chapter stage timings collected for --metrics, reported as JSON."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.chapters = []
+
+    def add(self, name, timings):
+        self.chapters.append((name, timings))
+
+    def report(self, **extra):
+        stages = {}
+        for stage in TIMED_STAGES:
+            values = [timings.get(stage, 0.0) for _, timings in self.chapters]
+            if any(values):
+                stages[stage] = summarize(values)
+        per_chapter = [
+            dict(chapter=name, seconds=sum(timings.get(stage, 0.0) for stage in TIMED_STAGES), **timings)
+            for name, timings in self.chapters
+        ]
+        return dict(
+            chapters=len(self.chapters),
+            wall_seconds=time.perf_counter() - self.started,
+            bytes=sum(timings.get("bytes", 0) for _, timings in self.chapters),
+            retries=sum(timings.get("retries", 0) for _, timings in self.chapters),
+            stages=stages,
+            slowest_chapters=sorted(per_chapter, key=lambda item: item["seconds"], reverse=True)[:10],
+            per_chapter=per_chapter,
+            **extra,
+        )
+
+    def write(self, path, **extra):
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.report(**extra), handle, indent=2)
+
+
+BSB_LINE_RE = re.compile(r"^(.+?)\s+(\d+):(\d+)\t(.*)$")
+BSB_INDEX_FORMAT = 1
+
+
+def bsb_key(book_number, chapter, verse):
+    return (book_number * 1000 + chapter) * 1000 + verse
+
+
+class BSBIndex:
+    """Verse lookup into a memory-mapped bsb.txt through its bsb.txt.idx sidecar."""
+
+    def __init__(self, path):
+        self.path = path
+        self.sidecar = f"{path}.idx"
+        stat = os.stat(path)
+        self.stamp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if not self._load():
+            self._build()
+            self._save()
+        with open(path, "rb") as handle:
+            self.text = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        self.book_numbers = {book: number for number, book in enumerate(self.books)}
+
+    def _header(self):
+        return dict(
+            format=BSB_INDEX_FORMAT,
+            byteorder=sys.byteorder,
+            books=self.books,
+            rows=len(self.keys),
+            **self.stamp,
+        )
+
+    def _load(self):
+        try:
+            with open(self.sidecar, "rb") as handle:
+                header = json.loads(handle.readline())
+                expected = dict(format=BSB_INDEX_FORMAT, byteorder=sys.byteorder, **self.stamp)
+                if any(header.get(name) != value for name, value in expected.items()):
+                    return False
+                self.books = header["books"]
+                self.keys = array.array("I")
+                self.starts = array.array("Q")
+                self.ends = array.array("Q")
+                for column in (self.keys, self.starts, self.ends):
+                    column.fromfile(handle, header["rows"])
+        except (OSError, ValueError, KeyError, EOFError):
+            return False
+        return True
+
+    def _build(self):
+        self.books = []
+        numbers = {}
+        rows = {}
+        offset = 0
+        with open(self.path, "rb") as handle:
+            for raw in handle:
+                line_offset = offset
+                offset += len(raw)
+                decoded = raw.decode("utf-8")
+                line = decoded.strip()
+                if not line or line.startswith("The Holy Bible") or line.startswith("This text"):
+                    continue
+                if line.startswith("Verse\t"):
+                    continue
+                match = BSB_LINE_RE.match(line)
+                if not match:
+                    continue
+                book, chapter, verse, text = match.groups()
+                if book == "Psalm":
+                    book = "Psalms"
+                if book not in numbers:
+                    numbers[book] = len(self.books)
+                    self.books.append(book)
+                lead = len(decoded) - len(decoded.lstrip())
+                start = line_offset + len(decoded[:lead + match.start(4)].encode("utf-8"))
+                rows[bsb_key(numbers[book], int(chapter), int(verse))] = (start, start + len(text.encode("utf-8")))
+        self.keys = array.array("I", sorted(rows))
+        self.starts = array.array("Q", (rows[key][0] for key in self.keys))
+        self.ends = array.array("Q", (rows[key][1] for key in self.keys))
+
+    def _save(self):
+        tmp_path = f"{self.sidecar}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as handle:
+                handle.write(json.dumps(self._header()).encode("utf-8") + b"\n")
+                for column in (self.keys, self.starts, self.ends):
+                    column.tofile(handle)
+            os.replace(tmp_path, self.sidecar)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def chapter_verses(self, book, chapter):
+        """Return [(verse, text)] for one chapter, in verse order."""
+        number = self.book_numbers.get(book)
+        if number is None:
+            return []
+        first = bisect.bisect_left(self.keys, bsb_key(number, chapter, 0))
+        last = bisect.bisect_left(self.keys, bsb_key(number, chapter + 1, 0))
+        return [
+            (self.keys[row] % 1000, self.text[self.starts[row]:self.ends[row]].decode("utf-8").strip())
+            for row in range(first, last)
+        ]
 
 
 def load_bsb_index(bsb_path):
-    index = {}
-    with open(bsb_path, "r", encoding="utf-8") as handle:
-        for line in handle:
-            line = line.strip()
-            if not line or line.startswith("The Holy Bible") or line.startswith("This text"):
-                continue
-            if line.startswith("Verse\t"):
-                continue
-            match = re.match(r"^(.+?)\s+(\d+):(\d+)\t(.*)$", line)
-            if not match:
-                continue
-            book, chapter, verse, text = match.groups()
-            if book == "Psalm":
-                book = "Psalms"
-            chapter_num = int(chapter)
-            verse_num = int(verse)
-            index.setdefault(book, {}).setdefault(chapter_num, {})[verse_num] = text.strip()
-    return index
+    return BSBIndex(bsb_path)
+
+
+def bsb_chapter_model(book, chapter, bsb_index):
+    """Return a chapter model of one BSB chapter, for the verse store."""
+    events = []
+    for verse_num, text in bsb_index.chapter_verses(book, chapter):
+        events.append(("verse", str(verse_num)))
+        events.append(("text", text))
+    return {"notes": False, "events": events, "footnotes": [], "footnote_map": {}}
 
 
 def build_bsb_chapter_content(book, chapter, bsb_index):
-    verses = bsb_index.get(book, {}).get(chapter, {})
+    verses = bsb_index.chapter_verses(book, chapter)
     if not verses:
         return ""
     lines = []
-    for verse_num in sorted(verses.keys()):
+    for verse_num, text in verses:
         lines.append(f"###### {verse_num}")
-        lines.append(verses[verse_num])
+        lines.append(text)
         lines.append("")
     return "\n".join(lines).strip()
 
 
-def parse_passage(html_text, include_headers, bold_words, include_footnotes):
-    parser = BibleGatewayParser(
-        include_headers=include_headers,
-        bold_words=bold_words,
-        include_footnotes=include_footnotes,
-    )
-    parser.feed(html_text)
+def footnote_label(number):
+    """Return the letter label of the number-th footnote of a chapter: a, b, ..., z, aa, ab, ..."""
+    label = ""
+    number += 1
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        label = chr(ord("a") + remainder) + label
+    return label
+
+
+class ChapterBuilder:
+    """Collect the chapter model of one chapter read from a local source."""
+
+    def __init__(self, book_index, chapter):
+        self.book_index = book_index
+        self.chapter = chapter
+        self.current_verse = None
+        self.events = []
+        self.footnotes = []
+        self.footnote_map = {}
+        self.line_start = True
+
+    def text(self, text):
+        if self.line_start:
+            text = text.lstrip(" \t")
+        if text:
+            self.events.append(("text", text))
+            self.line_start = text.endswith("\n")
+
+    def verse(self, number):
+        self.current_verse = number
+        self.events.append(("verse", number))
+        self.line_start = True
+
+    def heading(self, title):
+        title = " ".join(title.split())
+        if title:
+            self.events.append(("heading", title))
+            self.line_start = True
+
+    def woj(self, state):
+        self.events.append(("woj", state))
+
+    def note(self, note, ref=None):
+        note = normalize_markdown(" ".join(note.split()))
+        if not note:
+            return
+        label = footnote_label(len(self.footnotes))
+        item_id = f"{self.chapter}-{label}"
+        self.events.append(("note", label))
+        self.footnotes.append((item_id, ref or f"{self.chapter}:{self.current_verse or 1}", note))
+        self.footnote_map[item_id] = label
+
+    def result(self):
+        model = {
+            "notes": True,
+            "events": compact_events(self.events),
+            "footnotes": self.footnotes,
+            "footnote_map": self.footnote_map,
+        }
+        return self.book_index, self.chapter, model
+
+
+def iter_tsv_chapters(path, resolve_book):
+    """Stream chapters from a tab-separated file."""
+    builder = None
+    with open(path, "r", encoding="utf-8-sig") as handle:
+        for line in handle:
+            columns = line.rstrip("\r\n").split("\t")
+            if len(columns) >= 4 and columns[1].strip().isdigit() and columns[2].strip().isdigit():
+                book, chapter, verse, text = columns[0], columns[1], columns[2], "\t".join(columns[3:])
+            else:
+                match = BSB_LINE_RE.match(line.strip())
+                if not match:
+                    continue
+                book, chapter, verse, text = match.groups()
+            book_index = resolve_book(book)
+            if book_index is None:
+                continue
+            chapter = int(chapter)
+            if builder is None or (builder.book_index, builder.chapter) != (book_index, chapter):
+                if builder is not None:
+                    yield builder.result()
+                builder = ChapterBuilder(book_index, chapter)
+            builder.verse(str(int(verse)))
+            builder.text(text.strip())
+    if builder is not None:
+        yield builder.result()
+
+
+USFM_MARKER_RE = re.compile(r"\\\+?([A-Za-z]+[0-9]*)(\*?)")
+USFM_PARAGRAPHS = {"p", "m", "pi", "pi1", "pi2", "pi3", "mi", "nb", "pc", "pr", "pm", "pmo", "pmc", "pmr", "li",
+                   "li1", "li2", "li3", "lim", "cls", "b", "d"}
+USFM_POETRY = {"q", "q1", "q2", "q3", "q4", "qr", "qc", "qm", "qm1", "qm2", "qd"}
+USFM_HEADINGS = {"s", "s1", "s2", "s3", "s4", "ms", "ms1", "ms2", "ms3", "sp", "qa"}
+USFM_SKIP_LINES = {"ide", "h", "toc1", "toc2", "toc3", "toca1", "toca2", "toca3", "rem", "sts", "usfm", "mt",
+                   "mt1", "mt2", "mt3", "mt4", "mte", "mte1", "mte2", "imt", "imt1", "imt2", "is", "is1", "is2",
+                   "ip", "ipi", "im", "ipr", "iot", "io", "io1", "io2", "io3", "ie", "cl", "r", "mr", "sr"}
+USFM_SKIP_SPANS = {"x", "fig", "ca", "va", "vp", "rq"}
+USFM_NOTES = {"f", "fe", "ef"}
+USFM_NOTE_TEXT = {"ft", "fq", "fqa", "fk", "fl", "fw", "fp", "fv"}
+USFM_BLOCKS = USFM_PARAGRAPHS | USFM_POETRY | USFM_HEADINGS | USFM_SKIP_LINES | {"id", "c", "v"}
+
+
+class UsfmReader:
+    """Turn USFM lines into chapter models; finished chapters collect in `done`."""
+
+    def __init__(self, resolve_book):
+        self.resolve_book = resolve_book
+        self.book_index = None
+        self.builder = None
+        self.done = []
+        self.expect = None
+        self.skip_line = False
+        self.skip_span = None
+        self.heading = None
+        self.note = None
+        self.note_field = None
+        self.note_ref = []
+        self.in_word = False
+
+    def feed(self, line):
+        position = 0
+        for match in USFM_MARKER_RE.finditer(line):
+            self._text(line[position:match.start()])
+            position = match.end()
+            closing = bool(match.group(2))
+            if not closing and line[position:position + 1] == " ":
+                position += 1
+            self._marker(match.group(1).lower(), closing)
+        self._text(line[position:].rstrip("\r\n"))
+        self._close_heading()
+        self.skip_line = False
+        if self.builder is not None and self.note is None and not self.skip_span:
+            self.builder.text(" ")
+
+    def close(self):
+        self._finish_chapter()
+
+    def _finish_chapter(self):
+        if self.builder is not None:
+            self.done.append(self.builder.result())
+            self.builder = None
+
+    def _close_heading(self):
+        if self.heading is not None:
+            if self.builder is not None:
+                self.builder.heading("".join(self.heading))
+            self.heading = None
+
+    def _text(self, text):
+        if not text:
+            return
+        if self.expect:
+            word, _, text = text.lstrip().partition(" ")
+            expected = self.expect
+            self.expect = None
+            if expected == "id":
+                self._finish_chapter()
+                self.book_index = self.resolve_book(word)
+                self.skip_line = True
+                return
+            if expected == "c":
+                self._finish_chapter()
+                if self.book_index is not None and word.isdigit():
+                    self.builder = ChapterBuilder(self.book_index, int(word))
+            elif expected == "v" and self.builder is not None:
+                self.builder.verse(word)
+            if not text:
+                return
+        if self.skip_line or self.skip_span:
+            return
+        if self.note is not None:
+            if self.note_field == "fr":
+                self.note_ref.append(text)
+            elif self.note_field in USFM_NOTE_TEXT:
+                self.note.append(text)
+            return
+        if self.heading is not None:
+            self.heading.append(text)
+            return
+        if self.builder is not None:
+            if self.in_word:
+                text = text.split("|")[0]
+            self.builder.text(text)
+
+    def _marker(self, name, closing):
+        if self.skip_span:
+            if closing and name == self.skip_span:
+                self.skip_span = None
+            return
+        if self.note is not None:
+            if closing and name in USFM_NOTES:
+                self._finish_note()
+            elif name in USFM_NOTE_TEXT or name == "fr":
+                self.note_field = "ft" if closing else name
+            return
+        if closing:
+            if name == "wj" and self.builder is not None:
+                self.builder.woj("close")
+            elif name == "w":
+                self.in_word = False
+            return
+        if name in USFM_BLOCKS:
+            self._close_heading()
+            self.skip_line = False
+        if name in ("id", "c", "v"):
+            self.expect = name
+        elif name in USFM_HEADINGS:
+            self.heading = []
+        elif name in USFM_SKIP_LINES:
+            self.skip_line = True
+        elif name in USFM_SKIP_SPANS:
+            self.skip_span = name
+        elif name in USFM_NOTES:
+            self.note = []
+            self.note_ref = []
+            self.note_field = None
+        elif self.builder is None:
+            return
+        elif name in USFM_PARAGRAPHS:
+            self.builder.text("\n\n")
+        elif name in USFM_POETRY:
+            self.builder.text("\n")
+        elif name == "wj":
+            self.builder.woj("open")
+        elif name == "w":
+            self.in_word = True
+
+    def _finish_note(self):
+        note = "".join(self.note)
+        ref = None
+        ref_match = re.search(r"(\d+)\s*[:.]\s*(\d+)", "".join(self.note_ref))
+        if ref_match:
+            ref = f"{ref_match.group(1)}:{ref_match.group(2)}"
+        self.note = None
+        self.note_field = None
+        if self.builder is not None:
+            self.builder.note(note, ref)
+
+
+def iter_usfm_chapters(path, resolve_book):
+    """Stream chapters from a USFM file, or from every .usfm/.sfm file in a folder."""
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith((".usfm", ".sfm"))
+        )
+    else:
+        paths = [path]
+    for file_path in paths:
+        reader = UsfmReader(resolve_book)
+        with open(file_path, "r", encoding="utf-8-sig") as handle:
+            for line in handle:
+                reader.feed(line)
+                yield from reader.done
+                reader.done = []
+        reader.close()
+        yield from reader.done
+
+
+def iter_osis_chapters(path, resolve_book):
+    """Stream chapters from an OSIS XML file with ElementTree.iterparse."""
+    builder = None
+    book_index = None
+    done = []
+    stack = []
+    skip = note = title = None
+    note_parts = []
+    title_parts = []
+    woj_elements = set()
+    woj_ids = set()
+    previous = None
+
+    def local(tag):
+        return tag.rsplit("}", 1)[-1]
+
+    def add_text(text):
+        if not text or skip is not None or builder is None:
+            return
+        if note is not None:
+            note_parts.append(text)
+        elif title is not None:
+            title_parts.append(text)
+        else:
+            builder.text(re.sub(r"\s+", " ", text))
+
+    def finish_chapter():
+        nonlocal builder
+        if builder is not None:
+            done.append(builder.result())
+            builder = None
+
+    def reference(osis_ref):
+        match = re.match(r"\w+\.(\d+)\.(\d+)", osis_ref or "")
+        return f"{match.group(1)}:{match.group(2)}" if match else None
+
+    for event, elem in ElementTree.iterparse(path, events=("start", "end")):
+        if previous is not None:
+            previous_event, previous_elem = previous
+            if previous_event == "start":
+                add_text(previous_elem.text)
+            else:
+                add_text(previous_elem.tail)
+                if stack:
+                    stack[-1].remove(previous_elem)
+                previous_elem.clear()
+        previous = (event, elem)
+        name = local(elem.tag)
+        attrs = elem.attrib
+
+        if event == "start":
+            stack.append(elem)
+            if skip is not None:
+                continue
+            if name == "div" and attrs.get("type") == "book":
+                finish_chapter()
+                book_index = resolve_book(attrs.get("osisID", ""))
+            elif name == "chapter":
+                if "eID" in attrs:
+                    finish_chapter()
+                    continue
+                finish_chapter()
+                parts = (attrs.get("osisID") or attrs.get("sID") or "").split(".")
+                if len(parts) >= 2 and parts[-1].isdigit():
+                    book_index = resolve_book(parts[0]) if resolve_book(parts[0]) is not None else book_index
+                    if book_index is not None:
+                        builder = ChapterBuilder(book_index, int(parts[-1]))
+            elif builder is None:
+                continue
+            elif name == "verse":
+                if "eID" not in attrs:
+                    number = (attrs.get("osisID") or attrs.get("sID") or "").split()[0].split(".")[-1]
+                    if number:
+                        builder.verse(number)
+            elif name == "note":
+                if attrs.get("type") == "crossReference":
+                    skip = elem
+                else:
+                    note = elem
+                    note_parts = []
+            elif name == "title" and note is None:
+                if attrs.get("canonical") == "true":
+                    builder.text("\n\n")
+                else:
+                    title = elem
+                    title_parts = []
+            elif name == "q" and attrs.get("who") == "Jesus" and note is None:
+                if "sID" in attrs:
+                    woj_ids.add(attrs["sID"])
+                elif "eID" not in attrs:
+                    woj_elements.add(elem)
+                builder.woj("open")
+            elif name == "q" and attrs.get("eID") in woj_ids:
+                woj_ids.discard(attrs["eID"])
+                builder.woj("close")
+            elif name == "lb" and note is None and title is None:
+                builder.text("\n")
+            continue
+
+        stack.pop()
+        if elem is skip:
+            skip = None
+        elif skip is not None:
+            continue
+        elif elem is note:
+            note = None
+            if builder is not None:
+                builder.note("".join(note_parts), reference(attrs.get("osisRef")))
+        elif elem is title:
+            title = None
+            if builder is not None:
+                builder.heading("".join(title_parts))
+        elif builder is None:
+            continue
+        elif elem in woj_elements:
+            woj_elements.discard(elem)
+            builder.woj("close")
+        elif name == "chapter" and "sID" not in attrs:
+            finish_chapter()
+        elif name == "div" and attrs.get("type") == "book":
+            finish_chapter()
+        elif name == "title" and attrs.get("canonical") == "true":
+            builder.text("\n\n")
+        elif name in ("p", "lg") and note is None:
+            builder.text("\n\n")
+        elif name == "l" and note is None:
+            builder.text("\n")
+        yield from done
+        done.clear()
+    finish_chapter()
+    yield from done
+
+
+SOURCE_FORMATS = {
+    "tsv": iter_tsv_chapters,
+    "usfm": iter_usfm_chapters,
+    "osis": iter_osis_chapters,
+}
+SOURCE_EXTENSIONS = {
+    ".tsv": "tsv",
+    ".txt": "tsv",
+    ".usfm": "usfm",
+    ".sfm": "usfm",
+    ".xml": "osis",
+    ".osis": "osis",
+}
+
+
+def detect_source_format(path):
+    if os.path.isdir(path):
+        return "usfm"
+    return SOURCE_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def book_resolver(*name_lists):
+    """Return a function mapping a book name, abbreviation or OSIS/USFM id to its index."""
+    lookup = {}
+    for names in name_lists:
+        for index, name in enumerate(names):
+            lookup.setdefault(normalize_key(name), index)
+    lookup.setdefault("psalm", BOOK_IDS.index("Ps"))
+    return lambda name: lookup.get(normalize_key(name))
+
+
+class SourceReader:
+    """Serve chapters of a streamed local source in the order the run asks for them."""
+
+    def __init__(self, chapters, wanted):
+        self.chapters = chapters
+        self.wanted = set(wanted)
+        self.held = {}
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def get(self, book_index, chapter):
+        key = (book_index, chapter)
+        with self.lock:
+            while key not in self.held and not self.exhausted:
+                try:
+                    found_book, found_chapter, model = next(self.chapters)
+                except StopIteration:
+                    self.exhausted = True
+                    break
+                if (found_book, found_chapter) in self.wanted:
+                    self.held[(found_book, found_chapter)] = model
+            return self.held.pop(key, None)
+
+
+def _container_pattern(classes, ids=()):
+    alternatives = [
+        r"\bclass\s*=\s*[\"']?[^\"'>]*(?<![\w-])" + re.escape(name) + r"(?![\w-])" for name in sorted(classes)
+    ]
+    alternatives += [r"\bid\s*=\s*[\"']?" + re.escape(name) + r"(?![\w-])" for name in sorted(ids)]
+    return re.compile(r"<div\b[^>]*(?:" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+
+PASSAGE_START_RE = _container_pattern(PASSAGE_CLASSES)
+FOOTNOTES_START_RE = _container_pattern(FOOTNOTE_CONTAINER_CLASSES, FOOTNOTE_CONTAINER_IDS)
+
+
+def find_div_region(html_text, start_re, closed=False):
+    """Return the (start, end) offsets of the first div matching start_re, or None."""
+    start = None
+    depth = 0
+    for match in DIV_SCAN_RE.finditer(html_text):
+        text = match.group(0)
+        if start is None:
+            if text[1:4].lower() == "div" and start_re.match(text):
+                start = match.start()
+                depth = 1
+            continue
+        if match.group(1) is None and text[1:4].lower() != "div":
+            continue
+        if match.group(1):
+            depth -= 1
+            if depth == 0:
+                return start, match.end()
+        elif not text.endswith("/>"):
+            depth += 1
+    if start is None or closed:
+        return None
+    return start, len(html_text)
+
+
+def passage_complete(html_text, include_footnotes):
+    """Whether the start of a page already holds every region passage_slices() keeps."""
+    if find_div_region(html_text, PASSAGE_START_RE, closed=True) is None:
+        return False
+    return not include_footnotes or find_div_region(html_text, FOOTNOTES_START_RE, closed=True) is not None
+
+
+SCAN_OPENER_RE = re.compile(r"<script\b|<style\b|<!--", re.IGNORECASE)
+
+
+class DivRegionWatch:
+    """find_div_region(..., closed=True) for a page that arrives piece by piece."""
+
+    def __init__(self, start_re):
+        self.start_re = start_re
+        self.pos = 0
+        self.start = None
+        self.depth = 0
+        self.region = None
+
+    def scan(self, text):
+        """Return the (start, end) offsets of the region once it is closed, else None."""
+        if self.region is not None:
+            return self.region
+        pos = self.pos
+        for match in DIV_SCAN_RE.finditer(text, pos):
+            if SCAN_OPENER_RE.search(text, pos, match.start()):
+                break
+            pos = match.end()
+            tag = match.group(0)
+            if self.start is None:
+                if tag[1:4].lower() == "div" and self.start_re.match(tag):
+                    self.start = match.start()
+                    self.depth = 1
+                continue
+            if match.group(1) is None and tag[1:4].lower() != "div":
+                continue
+            if match.group(1):
+                self.depth -= 1
+                if self.depth == 0:
+                    self.region = (self.start, pos)
+                    return self.region
+            elif not tag.endswith("/>"):
+                self.depth += 1
+        else:
+            opener = SCAN_OPENER_RE.search(text, pos)
+            tail = text.rfind("<", pos)
+            pos = min(opener.start() if opener else len(text), tail if tail >= 0 else len(text))
+        self.pos = pos
+        return None
+
+
+class PassageWatch:
+    """passage_complete() for a page read in chunks: call it with each new piece of text."""
+
+    def __init__(self, include_footnotes):
+        self.text = ""
+        self.regions = [DivRegionWatch(PASSAGE_START_RE)]
+        if include_footnotes:
+            self.regions.append(DivRegionWatch(FOOTNOTES_START_RE))
+
+    def __call__(self, piece):
+        self.text += piece
+        return all(region.scan(self.text) is not None for region in self.regions)
+
+
+def passage_slices(html_text, include_footnotes):
+    """Return the parts of a print page the parsers need to see, in document order."""
+    passage = find_div_region(html_text, PASSAGE_START_RE)
+    if passage is None:
+        return [html_text]
+    regions = [passage]
+    if include_footnotes:
+        footnotes = find_div_region(html_text, FOOTNOTES_START_RE)
+        if footnotes and not (passage[0] <= footnotes[0] < passage[1]):
+            regions.append(footnotes)
+            regions.sort()
+    return [html_text[start:end] for start, end in regions]
+
+
+PARSER_ENGINES = {"html": PassageParser, "fast": FastPassageParser}
+
+
+def _run_passage_parser(html_text, include_footnotes, preslice, track_chapters=False, engine="html"):
+    parser = PARSER_ENGINES[engine](include_footnotes=include_footnotes, track_chapters=track_chapters)
+    for part in passage_slices(html_text, include_footnotes) if preslice else [html_text]:
+        parser.feed(part)
     parser.close()
-    content = normalize_markdown("".join(parser.out))
+    return parser
+
 
+def _clean_footnotes(parser):
     footnotes = []
-    footnote_map = {}
+    for item_id, ref, note in parser.notes.footnotes:
+        cleaned_ref = normalize_markdown(ref)
+        cleaned_note = normalize_markdown(note)
+        if cleaned_note:
+            footnotes.append((item_id, cleaned_ref, cleaned_note))
+    return footnotes
+
+
+def compact_events(events):
+    """Merge runs of text events so a chapter model stays small."""
+    compacted = []
+    pending = []
+    for kind, value in events:
+        if kind == "text":
+            pending.append(value)
+            continue
+        if pending:
+            compacted.append(("text", "".join(pending)))
+            pending = []
+        compacted.append((kind, value))
+    if pending:
+        compacted.append(("text", "".join(pending)))
+    return compacted
+
+
+def render_events(events, include_headers, bold_words, include_footnotes):
+    out = []
+    for kind, value in events:
+        if kind == "text":
+            out.append(value)
+        elif kind == "verse":
+            out.append("\n\n###### " + value + "\n")
+        elif kind == "heading":
+            if include_headers:
+                out.append("\n\n##### " + value + "\n")
+        elif kind == "woj":
+            if bold_words:
+                out.append("**")
+        elif kind == "note":
+            if include_footnotes:
+                out.append(f"[^{value}]")
+    return normalize_markdown("".join(out))
+
+
+def parse_chapter_model(html_text, include_footnotes, preslice=True, timings=None, engine="html"):
+    """Parse a passage page into a JSON-serialisable chapter model."""
+    start = time.perf_counter()
+    parser = _run_passage_parser(html_text, include_footnotes, preslice, engine=engine)
+    model = {
+        "notes": include_footnotes,
+        "events": compact_events(parser.body.events),
+        "footnotes": _clean_footnotes(parser) if include_footnotes else [],
+        "footnote_map": parser.body.footnote_ref_map if include_footnotes else {},
+    }
+    add_timing(timings, "parse", time.perf_counter() - start)
+    return model
+
+
+def parse_chapter_models(html_text, chapters, include_footnotes, preslice=True, timings=None, engine="html"):
+    """Split a range page into one chapter model per chapter, or None if they do not match."""
+    start = time.perf_counter()
+    parser = _run_passage_parser(html_text, include_footnotes, preslice, track_chapters=True, engine=engine)
+    add_timing(timings, "parse", time.perf_counter() - start)
+    marks = parser.body.chapter_marks
+    if [chapter for _, chapter in marks] != list(chapters):
+        return None
+
+    notes_by_chapter = {chapter: [] for chapter in chapters}
     if include_footnotes:
-        footnote_parser = FootnoteParser()
-        footnote_parser.feed(html_text)
-        footnote_parser.close()
-        for item_id, ref, note in footnote_parser.footnotes:
-            cleaned_ref = normalize_markdown(ref)
-            cleaned_note = normalize_markdown(note)
-            if cleaned_note:
-                footnotes.append((item_id, cleaned_ref, cleaned_note))
-        footnote_map = parser.footnote_ref_map
+        for item in _clean_footnotes(parser):
+            ref_match = re.search(r"(\d+)\s*:\s*\d+", item[1])
+            if not ref_match or int(ref_match.group(1)) not in notes_by_chapter:
+                return None
+            notes_by_chapter[int(ref_match.group(1))].append(item)
+
+    events = parser.body.events
+    bounds = [0] + [position for position, _ in marks[1:]] + [len(events)]
+    models = []
+    ref_map = parser.body.footnote_ref_map
+    for idx, chapter in enumerate(chapters):
+        labels = {}
+        chapter_events = []
+        for kind, value in events[bounds[idx]:bounds[idx + 1]]:
+            if kind == "note":
+                value = labels.setdefault(value, footnote_label(len(labels)))
+            chapter_events.append((kind, value))
+        chapter_events = compact_events(chapter_events)
+        if not render_events(chapter_events, True, False, False):
+            return None
+        notes = notes_by_chapter[chapter]
+        models.append({
+            "notes": include_footnotes,
+            "events": chapter_events,
+            "footnotes": notes,
+            "footnote_map": {
+                item_id: labels[ref_map[item_id]] for item_id, _, _ in notes if ref_map.get(item_id) in labels
+            },
+        })
+    return models
+
+
+def render_model(model, include_headers, bold_words, include_footnotes, timings=None):
+    """Return the (content, footnotes, footnote_map) of a chapter model for one set of options."""
+    start = time.perf_counter()
+    include_footnotes = include_footnotes and model["notes"]
+    content = render_events(model["events"], include_headers, bold_words, include_footnotes)
+    footnotes = [tuple(item) for item in model["footnotes"]] if include_footnotes else []
+    footnote_map = model["footnote_map"] if include_footnotes else {}
+    add_timing(timings, "normalize", time.perf_counter() - start)
     return content, footnotes, footnote_map
 
 
+def parse_passage(
+    html_text, include_headers, bold_words, include_footnotes, preslice=True, timings=None, engine="html"
+):
+    model = parse_chapter_model(html_text, include_footnotes, preslice, timings, engine)
+    return render_model(model, include_headers, bold_words, include_footnotes, timings)
+
+
+def parse_passage_range(
+    html_text, chapters, include_headers, bold_words, include_footnotes, preslice=True, timings=None, engine="html"
+):
+    """Split a page covering several chapters into one parse_passage() result per chapter, or None."""
+    models = parse_chapter_models(html_text, chapters, include_footnotes, preslice, timings, engine)
+    if models is None:
+        return None
+    return [render_model(model, include_headers, bold_words, include_footnotes, timings) for model in models]
+
+
+class Manifest:
+    """Append-only journal of finished chapters, written next to the output folder."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.handle = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["file"]] = entry
+
+    def is_current(self, root, rel_path, settings):
+        entry = self.entries.get(rel_path)
+        if not entry or entry.get("settings") != settings:
+            return False
+        try:
+            with open(os.path.join(root, rel_path), "r", encoding="utf-8") as handle:
+                return hash_text(handle.read()) == entry.get("sha256")
+        except (OSError, UnicodeDecodeError):
+            return False
+
+    def record(self, rel_path, settings, text):
+        entry = {"file": rel_path, "settings": settings, "sha256": hash_text(text)}
+        self.entries[rel_path] = entry
+        if self.handle is None:
+            self.handle = open(self.path, "a", encoding="utf-8")
+        self.handle.write(json.dumps(entry) + "\n")
+        self.handle.flush()
+
+    def close(self, compact=False):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        if compact and self.entries:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                for entry in self.entries.values():
+                    handle.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    version TEXT NOT NULL,
+    book INTEGER NOT NULL,
+    chapter INTEGER NOT NULL,
+    format INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    UNIQUE (version, book, chapter)
+);
+CREATE TABLE IF NOT EXISTS verses (
+    id INTEGER PRIMARY KEY,
+    chapter_id INTEGER NOT NULL,
+    verse TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS verses_chapter ON verses (chapter_id);
+CREATE TABLE IF NOT EXISTS headings (
+    chapter_id INTEGER NOT NULL,
+    verse TEXT,
+    title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS headings_chapter ON headings (chapter_id);
+CREATE TABLE IF NOT EXISTS footnotes (
+    chapter_id INTEGER NOT NULL,
+    label TEXT,
+    ref TEXT NOT NULL,
+    note TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS footnotes_chapter ON footnotes (chapter_id);
+"""
+
+STORE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS verse_fts USING fts5(text, content='verses', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS verses_ai AFTER INSERT ON verses BEGIN
+    INSERT INTO verse_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS verses_ad AFTER DELETE ON verses BEGIN
+    INSERT INTO verse_fts (verse_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def model_rows(model):
+    """Split a chapter model into (verses, headings, footnotes) rows for the store."""
+    verses = []
+    headings = []
+    waiting = []
+    current = None
+    pending = []
+    for kind, value in model["events"]:
+        if kind == "verse":
+            if current is not None:
+                verses.append((current, " ".join(render_events(pending, False, False, False).split())))
+            current = value
+            pending = []
+            headings.extend((value, title) for title in waiting)
+            waiting = []
+        elif kind == "heading":
+            waiting.append(value)
+        else:
+            pending.append((kind, value))
+    if current is not None:
+        verses.append((current, " ".join(render_events(pending, False, False, False).split())))
+    headings.extend((None, title) for title in waiting)
+    footnote_map = model["footnote_map"]
+    footnotes = [(footnote_map.get(item_id), ref, note) for item_id, ref, note in model["footnotes"]]
+    return verses, headings, footnotes
+
+
+class VerseStore:
+    """SQLite database of parsed chapters, their verses, headings and footnotes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(STORE_SCHEMA)
+        try:
+            self.db.executescript(STORE_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self.pending = 0
+
+    def get_model(self, version, book, chapter):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT format, model FROM chapters WHERE version = ? AND book = ? AND chapter = ?",
+                (version, book, chapter),
+            ).fetchone()
+        if row is None or row[0] != MODEL_FORMAT:
+            return None
+        return json.loads(row[1])
+
+    def put_chapter(self, version, book, chapter, model):
+        verses, headings, footnotes = model_rows(model)
+        with self.lock:
+            db = self.db
+            row = db.execute(
+                "SELECT id FROM chapters WHERE version = ? AND book = ? AND chapter = ?", (version, book, chapter)
+            ).fetchone()
+            if row is not None:
+                chapter_id = row[0]
+                db.execute(
+                    "UPDATE chapters SET format = ?, model = ? WHERE id = ?",
+                    (MODEL_FORMAT, json.dumps(model), chapter_id),
+                )
+                for table in ("verses", "headings", "footnotes"):
+                    db.execute(f"DELETE FROM {table} WHERE chapter_id = ?", (chapter_id,))
+            else:
+                chapter_id = db.execute(
+                    "INSERT INTO chapters (version, book, chapter, format, model) VALUES (?, ?, ?, ?, ?)",
+                    (version, book, chapter, MODEL_FORMAT, json.dumps(model)),
+                ).lastrowid
+            db.executemany(
+                "INSERT INTO verses (chapter_id, verse, text) VALUES (?, ?, ?)",
+                [(chapter_id, verse, text) for verse, text in verses],
+            )
+            db.executemany(
+                "INSERT INTO headings (chapter_id, verse, title) VALUES (?, ?, ?)",
+                [(chapter_id, verse, title) for verse, title in headings],
+            )
+            db.executemany(
+                "INSERT INTO footnotes (chapter_id, label, ref, note) VALUES (?, ?, ?, ?)",
+                [(chapter_id, label, ref, note) for label, ref, note in footnotes],
+            )
+            self.pending += 1
+            if self.pending >= 100:
+                db.commit()
+                self.pending = 0
+
+    def search(self, query, version=None, limit=DEFAULT_SEARCH_LIMIT):
+        """Return (version, book, chapter, verse, text) rows matching query, in canonical order."""
+        if self.fts:
+            sql = (
+                "SELECT c.version, c.book, c.chapter, v.verse, v.text FROM verse_fts"
+                " JOIN verses v ON v.id = verse_fts.rowid JOIN chapters c ON c.id = v.chapter_id"
+                " WHERE verse_fts MATCH ?"
+            )
+            params = [query]
+        else:
+            sql = (
+                "SELECT c.version, c.book, c.chapter, v.verse, v.text FROM verses v"
+                " JOIN chapters c ON c.id = v.chapter_id WHERE v.text LIKE ?"
+            )
+            params = [f"%{query}%"]
+        if version:
+            sql += " AND c.version = ?"
+            params.append(version)
+        sql += " ORDER BY c.version, c.book, c.chapter, v.id LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+
+FSYNC_POLICIES = ("none", "end", "always")
+
+
+class VaultWriter:
+    """Write the files of every vault, following the --fsync policy."""
+
+    def __init__(self, fsync="none"):
+        self.fsync = fsync
+        self.folders = set()
+        self.unsynced = []
+        self.written = 0
+
+    def write(self, path, text):
+        """Write text to path unless the file already holds exactly that text."""
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                if handle.read() == text:
+                    return False
+        except (OSError, UnicodeDecodeError):
+            pass
+        folder = os.path.dirname(path)
+        if folder and folder not in self.folders:
+            os.makedirs(folder, exist_ok=True)
+            self.folders.add(folder)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(text)
+            if self.fsync == "always":
+                handle.flush()
+                os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync == "end":
+            self.unsynced.append(path)
+        self.written += 1
+        return True
+
+    def close(self):
+        """Flush written files (for --fsync end) and the folders holding renamed files to disk."""
+        if self.fsync == "none":
+            return
+        for path in self.unsynced:
+            _fsync_path(path)
+        self.unsynced = []
+        for folder in sorted(self.folders | {"."}):
+            _fsync_path(folder)
+
+
+ARCHIVE_FORMATS = {".zip": "zip", ".tar.gz": "w:gz", ".tgz": "w:gz", ".tar": "w"}
+
+
+def archive_format(path):
+    """Return the ARCHIVE_FORMATS entry for an --output-archive path, or None."""
+    for extension, archive in ARCHIVE_FORMATS.items():
+        if path.lower().endswith(extension):
+            return archive
+    return None
+
+
+class ArchiveWriter:
+    """Stream vault files into a zip or tar archive instead of writing them to disk."""
+
+    def __init__(self, path, fsync="none"):
+        self.path = path
+        self.fsync = fsync
+        self.tmp_path = path + ".tmp"
+        self.mtime = time.time()
+        self.written = 0
+        mode = archive_format(path)
+        if mode == "zip":
+            self.zip = zipfile.ZipFile(self.tmp_path, "w", zipfile.ZIP_DEFLATED)
+            self.tar = None
+        else:
+            self.zip = None
+            self.tar = tarfile.open(self.tmp_path, mode)
+
+    def write(self, path, text):
+        name = path.replace(os.sep, "/")
+        data = text.encode("utf-8")
+        if self.zip is not None:
+            info = zipfile.ZipInfo(name, time.localtime(self.mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self.zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(self.mtime)
+            info.mode = 0o644
+            self.tar.addfile(info, io.BytesIO(data))
+        self.written += 1
+        return True
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+        else:
+            self.tar.close()
+        if self.fsync != "none":
+            _fsync_path(self.tmp_path)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Close the unfinished archive and delete it."""
+        try:
+            if self.zip is not None:
+                self.zip.close()
+            else:
+                self.tar.close()
+        finally:
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+
+
+def _fsync_path(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Folders cannot be opened on Windows, where the rename is already durable.
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
 def load_lines(path):
     with open(path, "r", encoding="utf-8") as handle:
         return [line.strip() for line in handle if line.strip()]
@@ -499,14 +2596,9 @@ class VersionParser(HTMLParser):
             self.current_text.append(data)
 
 
-def fetch_versions():
-    url = "https://www.biblegateway.com/versions/"
-    req = urllib.request.Request(
-        url,
-        headers={"User-Agent": "bg2obs.py (https://github.com/selfire1/BibleGateway-to-Obsidian)"},
-    )
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        html_text = resp.read().decode("utf-8", errors="replace")
+def fetch_versions(transport=None):
+    transport = transport or default_transport()
+    html_text = transport.get_text("/versions/")
 
     parser = VersionParser()
     parser.feed(html_text)
@@ -518,9 +2610,9 @@ def fetch_versions():
     return versions
 
 
-def print_versions():
+def print_versions(transport=None):
     try:
-        versions = fetch_versions()
+        versions = fetch_versions(transport)
     except Exception as exc:
         print(f"Failed to fetch versions: {exc}")
         return 1
@@ -572,34 +2664,836 @@ def format_footnotes(footnotes, footnote_map, book, chapter, abbreviation):
             ref_chapter = ref_match.group(1)
             ref_verse = ref_match.group(2)
             link_target = f"{abbreviation} {ref_chapter}#{ref_verse}"
-            if not ref.strip():
+            if not ref.strip() or ref.strip() == f"{ref_chapter}:{ref_verse}":
                 link_text = f"{book} {ref_chapter}:{ref_verse}"
         link = f"[[{link_target}|{link_text}]]"
         lines.append(f"[^{label}]: {link} {note}")
     return "\n\n" + "\n".join(lines)
 
 
+CROSSREF_NOISE_WORDS = ("freestar", "buy now", "our price", "retail:", "view more titles", "dropdown")
+CROSSREF_NOISE_RE = re.compile("|".join(re.escape(word) for word in CROSSREF_NOISE_WORDS), re.IGNORECASE)
+CROSSREF_SHAPE_RE = re.compile(r"\d ?: ?\d+ ?:")
+CROSSREF_NEXT_RE = re.compile(r"\dNext$", re.IGNORECASE | re.MULTILINE)
+# Letters re.IGNORECASE matches with "i" or "s" that str.lower() does not turn into them.
+CASE_ODDITIES = ("\u0130", "\u0131", "\u017f")
+
+
+@functools.lru_cache(maxsize=None)
+def crossref_pattern(book):
+    """Return one pattern for every line remove_crossref_lines() drops in a book."""
+    name = re.escape(book)
+    return re.compile(
+        rf"^{name}\s+(\d+)\s*:\s*\d+\s*:|^{name}\s+\d+Next$|{CROSSREF_NOISE_RE.pattern}", re.IGNORECASE
+    )
+
+
 def remove_crossref_lines(text, book, chapter):
-    pattern = re.compile(rf"^{re.escape(book)}\s+{chapter}\s*:\s*\d+\s*:", re.IGNORECASE)
-    next_pattern = re.compile(rf"^{re.escape(book)}\s+\d+Next$", re.IGNORECASE)
-    noise = re.compile(r"(freestar|Buy Now|Our Price|Retail:|View more titles|dropdown)", re.IGNORECASE)
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    compact = "\n".join(lines)
+    lowered = compact.lower()
+    if not (
+        any(word in lowered for word in CROSSREF_NOISE_WORDS)
+        or (not compact.isascii() and any(letter in compact for letter in CASE_ODDITIES))
+        or ("next" in lowered and CROSSREF_NEXT_RE.search(compact))
+        or (":" in compact and CROSSREF_SHAPE_RE.search(compact))
+    ):
+        return compact.strip()
+    pattern = crossref_pattern(book)
+    chapter = str(chapter)
     kept = []
-    for line in text.splitlines():
-        normalized = line.replace("\u00a0", " ")
-        compact = re.sub(r"\s+", " ", normalized).strip()
-        if pattern.match(compact):
-            continue
-        if next_pattern.match(compact):
-            continue
-        if noise.search(compact):
+    for line in lines:
+        match = pattern.search(line)
+        if match and (match.group(1) in (None, chapter) or CROSSREF_NOISE_RE.search(line)):
             continue
-        kept.append(compact)
+        kept.append(line)
     return "\n".join(kept).strip()
 
 
+ChapterInfo = namedtuple(
+    "ChapterInfo", "book chapter prev_chapter next_chapter abbreviation abbr_medium abbr_short"
+)
+# The names of one locales/<language> folder; abbreviations are the ones used for file names.
+Locale = namedtuple("Locale", "language bible_name books abbr_medium abbr_short abbreviations")
+
+
+def load_locale(language, abbr_short=False, abbr_medium=False):
+    """Load locales/<language>, or return None if there is no such locale."""
+    folder = os.path.join("locales", language)
+    if not os.path.exists(os.path.join(folder, "name.txt")):
+        return None
+    books = load_lines(os.path.join(folder, "books.txt"))
+    medium = load_lines(os.path.join(folder, "booksAbbr.txt"))
+    short = load_lines(os.path.join(folder, "booksAbbrShort.txt"))
+    if abbr_short:
+        abbreviations = short
+    elif abbr_medium:
+        abbreviations = medium
+    else:
+        abbreviations = books
+    return Locale(language, load_lines(os.path.join(folder, "name.txt"))[0], books, medium, short, abbreviations)
+
+RenderOptions = namedtuple(
+    "RenderOptions", "include_headers bold_words footnotes aliases bc_inline bc_yaml clean_crossrefs"
+)
+
+# One output folder and index; locale is an index into the run's locales.
+Vault = namedtuple("Vault", "name folder version locale options")
+
+# --variant flag letters, matching the command-line switches.
+VARIANT_FLAGS = {
+    "b": "bold_words",
+    "e": "include_headers",
+    "a": "aliases",
+    "c": "bc_inline",
+    "y": "bc_yaml",
+    "f": "footnotes",
+}
+
+
+def parse_variant(spec, base):
+    """Parse a --variant "FLAGS:NAME" into (name, options), or return None if it is malformed."""
+    flags, sep, name = spec.partition(":")
+    name = name.strip()
+    if not sep or not name or any(flag not in VARIANT_FLAGS for flag in flags):
+        return None
+    return name, base._replace(**{field: flag in flags for flag, field in VARIANT_FLAGS.items()})
+
+
+def render_chapter(info, chapter_content, footnotes, footnote_map, options, timings=None):
+    """Assemble the Markdown file for one chapter, or return None if it has no text."""
+    if not chapter_content:
+        return None
+    start = time.perf_counter()
+    book = info.book
+    chapter = info.chapter
+    prev_chapter = info.prev_chapter
+    next_chapter = info.next_chapter
+    prev_file = f"{info.abbreviation} {prev_chapter}" if prev_chapter else None
+    next_file = f"{info.abbreviation} {next_chapter}" if next_chapter else None
+
+    if options.clean_crossrefs:
+        chapter_content = remove_crossref_lines(chapter_content, book, chapter)
+    cleaned = time.perf_counter()
+    add_timing(timings, "cleanup", cleaned - start)
+
+    if not options.bc_inline and not options.bc_yaml:
+        navigation = f"[[{book}]]"
+        if prev_chapter:
+            navigation = f"[[{prev_file}|< {book} {prev_chapter}]] | " + navigation
+        if next_chapter:
+            navigation = navigation + f" | [[{next_file}|{book} {next_chapter} >]]"
+    else:
+        navigation = f"(up:: [[{book}]])"
+        if prev_chapter:
+            navigation = f"(previous:: [[{prev_file}|< {book} {prev_chapter}]]) | " + navigation
+        if next_chapter:
+            navigation = navigation + f" | (next:: [[{next_file}|{book} {next_chapter} >]])"
+
+    if options.footnotes:
+        chapter_content = chapter_content + format_footnotes(
+            footnotes, footnote_map, book, chapter, info.abbreviation
+        )
+    title = f"# {book} {chapter}"
+    yaml_needed = options.bc_yaml or options.aliases
+    if options.bc_yaml:
+        chapter_body = f"{title}\n\n***\n{chapter_content}"
+    else:
+        chapter_body = f"{title}\n\n{navigation}\n\n***\n{chapter_content}"
+
+    if yaml_needed:
+        yaml_lines = ["---"]
+        if options.aliases:
+            alias_long = f"{book} {chapter}"
+            alias_med = f"{info.abbr_medium} {chapter}"
+            alias_short = f"{info.abbr_short} {chapter}"
+            aliases = []
+            for alias in (alias_long, alias_med, alias_short):
+                if alias not in aliases:
+                    aliases.append(alias)
+            if len(aliases) > 1:
+                yaml_lines.append(f"aliases: [{', '.join(aliases)}]")
+        if options.bc_yaml:
+            if prev_chapter:
+                yaml_lines.append(f"previous: ['{prev_file}']")
+            yaml_lines.append(f"up: ['{book}']")
+            if next_chapter:
+                yaml_lines.append(f"next: ['{next_file}']")
+        yaml_lines.append("---\n\n")
+        chapter_body = "\n".join(yaml_lines) + chapter_body
+    add_timing(timings, "render", time.perf_counter() - cleaned)
+    return chapter_body
+
+
+VERSE_HEADING_RE = re.compile(r"^###### (\S+)[ \t]*$", re.MULTILINE)
+
+
+def split_verses(content):
+    """Split rendered chapter content into [(verse, text)], one line of text per verse."""
+    parts = VERSE_HEADING_RE.split(content)
+    verses = []
+    for verse, text in zip(parts[1::2], parts[2::2]):
+        lines = [line.strip() for line in text.strip().splitlines()]
+        verses.append((verse, "<br>".join(line for line in lines if line)))
+    return verses
+
+
+VERSE_NUMBER_RE = re.compile(r"^(\d+)[a-z]?(?:\s*[-–]\s*(\d+)[a-z]?)?$")
+
+
+def verse_numbers(markers):
+    """Expand verse markers such as "16" or "17-18" into verse numbers; other markers are skipped."""
+    numbers = []
+    for marker in markers:
+        match = VERSE_NUMBER_RE.match(marker)
+        if match:
+            first = int(match.group(1))
+            numbers.extend(range(first, max(first, int(match.group(2) or first)) + 1))
+    return numbers
+
+
+def expected_verses(version, book_index, chapter):
+    """Return (count, omitted): how many verses the chapter has in `version` and which it may leave out."""
+    key = f"{BOOK_IDS[book_index]}.{chapter}"
+    versification = VERSIFICATION.get(version.upper(), UNKNOWN_VERSIFICATION)
+    count = versification["counts"].get(key, VERSE_COUNTS[book_index][chapter - 1])
+    return count, set(versification["omitted"].get(key, ()))
+
+
+def verse_ranges(numbers):
+    """Write sorted verse numbers compactly, e.g. "3-5, 9"."""
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ", ".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def verse_anomaly(version, book_index, chapter, markers):
+    """Check a chapter's verse markers; return None or (kind, detail), kind being gap, short or extra."""
+    count, omitted = expected_verses(version, book_index, chapter)
+    numbers = verse_numbers(markers)
+    found = set(numbers)
+    missing = [number for number in range(1, count + 1) if number not in found and number not in omitted]
+    last = max(found, default=0)
+    gaps = [number for number in missing if number < last]
+    if gaps:
+        return "gap", f"{len(missing)} of {count} verses missing: {verse_ranges(missing)}"
+    if missing:
+        return "short", f"{len(missing)} of {count} verses missing: {verse_ranges(missing)}"
+    seen = set()
+    repeated = {number for number in numbers if number in seen or seen.add(number)}
+    extra = sorted(repeated | {number for number in found if not 1 <= number <= count})
+    if extra:
+        return "extra", f"unexpected or repeated verses: {verse_ranges(extra)}"
+    return None
+
+
+def parallel_table(versions, verse_lists):
+    """Lay out the verses of several versions side by side as a Markdown table."""
+    columns = [dict(verses) for verses in verse_lists]
+    order = []
+    for verses in verse_lists:
+        order.extend(verse for verse, _ in verses if verse not in order)
+    order.sort(key=lambda verse: (int(re.match(r"\d*", verse).group() or 0), verse))
+    lines = ["| | " + " | ".join(versions) + " |", "|---" * (len(versions) + 1) + "|"]
+    for verse in order:
+        cells = [column.get(verse, "").replace("|", "\\|") for column in columns]
+        lines.append(f"| {verse} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def render_batch(job):
+    """Parse one page and render its chapters for every vault, or return None if it does not split."""
+    page, infos, variants, timings, keep_models, with_verses, engine = job
+    if page is None:
+        return [(None, None, timings, None, None) for _ in infos]
+    with_notes = any(options.footnotes for _, options in variants)
+    truncated = isinstance(page, str) and not passage_complete(page, False)
+    if isinstance(page, str):
+        if len(infos) > 1:
+            chapters = [locale_infos[0].chapter for locale_infos in infos]
+            models = parse_chapter_models(page, chapters, with_notes, timings=timings, engine=engine)
+            if models is None:
+                return None
+        else:
+            models = [parse_chapter_model(page, with_notes, timings=timings, engine=engine)]
+    else:
+        models = page
+        keep_models = False
+
+    rendered = []
+    for index, (locale_infos, model) in enumerate(zip(infos, models)):
+        chapter_timings = None
+        if timings is not None:
+            chapter_timings = {
+                stage: value / len(infos) if stage in TIMED_STAGES else (value if index == 0 else 0)
+                for stage, value in timings.items()
+            }
+        if model is None:
+            rendered.append((None, None, chapter_timings, None, None))
+            continue
+        bodies = []
+        contents = {}
+        for locale, options in variants:
+            if isinstance(model, dict):
+                flags = (options.include_headers, options.bold_words, options.footnotes)
+                if flags not in contents:
+                    contents[flags] = render_model(model, *flags, timings=chapter_timings)
+                chapter = contents[flags]
+            else:
+                chapter = model
+            text = render_chapter(locale_infos[locale], *chapter, options, timings=chapter_timings)
+            bodies.append((text, chapter[1]))
+        if any(text is None for text, _ in bodies):
+            bodies = None
+        verses = None
+        if with_verses:
+            bold_words = variants[0][1].bold_words
+            content = render_model(model, False, bold_words, False)[0] if isinstance(model, dict) else model[0]
+            verses = split_verses(content)
+        if isinstance(model, dict):
+            markers = [value for kind, value in model["events"] if kind == "verse"]
+        else:
+            markers = VERSE_HEADING_RE.findall(model[0])
+        rendered.append((bodies, model if keep_models else None, chapter_timings, verses, (markers, truncated)))
+    return rendered
+
+
+# One vault file as iter_chapters() yields it; front_matter + body is the file's text.
+RenderedChapter = namedtuple(
+    "RenderedChapter", "vault version book_index chapter path front_matter body footnotes timings"
+)
+
+
+def split_front_matter(text):
+    """Split a rendered chapter into (front_matter, body); front_matter is "" without YAML."""
+    if not text.startswith("---\n"):
+        return "", text
+    end = text.index("\n---\n\n") + len("\n---\n\n")
+    return text[:end], text[end:]
+
+
+def chapter_plan(book_indices, chapter=None):
+    """Return [(book_index, chapters)]: every chapter of each book, or only `chapter`."""
+    if chapter is not None:
+        return [(book_index, [chapter]) for book_index in book_indices]
+    return [(book_index, list(range(1, BOOK_CHAPTERS[book_index] + 1))) for book_index in book_indices]
+
+
+def chapter_infos(locales, plan):
+    """Return {(book_index, chapter): ChapterInfo per locale} for a chapter plan."""
+    infos = {}
+    for book_index, chapters in plan:
+        for idx, chapter in enumerate(chapters):
+            infos[(book_index, chapter)] = tuple(
+                ChapterInfo(
+                    book=locale.books[book_index],
+                    chapter=chapter,
+                    prev_chapter=chapters[idx - 1] if idx > 0 else None,
+                    next_chapter=chapters[idx + 1] if idx + 1 < len(chapters) else None,
+                    abbreviation=locale.abbreviations[book_index],
+                    abbr_medium=locale.abbr_medium[book_index],
+                    abbr_short=locale.abbr_short[book_index],
+                )
+                for locale in locales
+            )
+    return infos
+
+
+def chapter_path(info):
+    """Return a chapter's file path inside its vault folder."""
+    return os.path.join(info.book, f"{info.abbreviation} {info.chapter}.md")
+
+
+def book_overview(vault_name, title, abbreviation, first_chapter):
+    """Return a book's overview file, linking the vault index and the book's first chapter."""
+    return f"links: [[{vault_name}]]\n# {title}\n\n[[{abbreviation} {first_chapter}|Start Reading >]]"
+
+
+def vault_index(folder, books):
+    """Return a vault's index file; books lists (title, abbreviation, chapters) in order."""
+    parts = [f"# {folder}"]
+    for title, abbreviation, chapters in books:
+        parts.append(f"\n* {title}:")
+        parts.extend(f" [[{abbreviation} {chapter}|{chapter}]]" for chapter in chapters)
+    return "".join(parts)
+
+
+SHARD_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
+SHARD_MANIFEST_RE = re.compile(r"^shard-(\d+)-of-(\d+)\.json$")
+
+
+def parse_shard(spec):
+    """Parse a --shard "i/N" into (i, N), or return None if it is malformed."""
+    match = SHARD_RE.match(spec)
+    if not match:
+        return None
+    shard, shards = int(match.group(1)), int(match.group(2))
+    if not 1 <= shard <= shards:
+        return None
+    return shard, shards
+
+
+def shard_chapters(plan, shard, shards, cost=None):
+    """Return the (book_index, chapter) pairs of shard `shard` (1-based) out of `shards`."""
+    chapters = [(book_index, chapter) for book_index, book_chapters in plan for chapter in book_chapters]
+    costs = [cost(*key) if cost else 1 for key in chapters]
+    total = sum(costs)
+    selected = []
+    running = 0
+    for key, value in zip(chapters, costs):
+        # A chapter belongs to the shard its midpoint falls in.
+        middle = (2 * running + value) * shards
+        if 2 * total * (shard - 1) <= middle < 2 * total * shard:
+            selected.append(key)
+        running += value
+    return selected
+
+
+VERSE_CHECKS = ("refetch", "report", "off")
+
+
+class VaultBuilder:
+    """Fetch, parse and render chapters without writing anything."""
+
+    def __init__(
+        self,
+        locales=None,
+        transport=None,
+        rate=DEFAULT_RATE,
+        retries=DEFAULT_RETRIES,
+        jobs=1,
+        workers=1,
+        batch_chapters=1,
+        cache=None,
+        store=None,
+        source=None,
+        source_format=None,
+        offline=False,
+        refresh=False,
+        stream=False,
+        parser="html",
+        verse_check="refetch",
+        metrics=None,
+    ):
+        self.locales = locales or [load_locale("en")]
+        self.transport = transport or HTTPTransport(BASE_URL, max_idle=jobs)
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.jobs = jobs
+        self.workers = workers
+        self.batch_chapters = batch_chapters
+        self.cache = cache
+        self.store = store
+        self.source = source
+        self.source_format = source_format or (detect_source_format(source) if source else None)
+        self.offline = offline
+        self.refresh = refresh
+        self.stream = stream
+        self.parser = parser
+        self.verse_check = verse_check
+        self.metrics = metrics
+        bsb_path = os.path.join("locales", self.locales[0].language, "bsb.txt")
+        self.bsb_path = bsb_path if not source and os.path.exists(bsb_path) else None
+        self.bsb_index = None
+        self.failures = {}
+        self.failed = []
+        self.retried = 0
+        self.batch_fallbacks = []
+        self.refetched = 0
+        self.anomalies = []
+
+    def is_bsb(self, version):
+        """Return True if `version` is built from the local BSB text instead of downloaded."""
+        return self.bsb_path is not None and version == BSB_VERSION
+
+    def chapter_label(self, version, book_index, chapter, versions=()):
+        label = f"{self.locales[0].books[book_index]} {chapter}"
+        return f"{label} ({version})" if len(versions) > 1 else label
+
+    def model_key(self, version, book_index, chapter):
+        return ("model", MODEL_FORMAT, version, BOOK_IDS[book_index], chapter)
+
+    def load_model(self, version, book_index, chapter):
+        """Return (model, from_cache), or (None, False) if neither the store nor the cache has it."""
+        model = None
+        if self.store:
+            model = self.store.get_model(version, book_index + 1, chapter)
+            if model is not None:
+                return model, False
+        if self.cache:
+            text = self.cache.get(self.model_key(version, book_index, chapter), chapters=0)
+            try:
+                model = json.loads(text) if text is not None else None
+            except ValueError:
+                model = None
+            if model is not None and self.store:
+                self.store.put_chapter(version, book_index + 1, chapter, model)
+        return model, model is not None
+
+    def load_models(self, version, book_index, chapters, with_notes, timings):
+        """Return the stored or cached chapter models for a batch, or None unless all of them are there."""
+        if not (self.cache or self.store) or self.refresh or self.source:
+            return None
+        start = time.perf_counter()
+        models = []
+        cached = 0
+        for chapter in chapters:
+            model, from_cache = self.load_model(version, book_index, chapter)
+            if model is None or (with_notes and not model["notes"]):
+                models = None
+                break
+            models.append(model)
+            cached += from_cache
+        if models is not None and cached:
+            self.cache.count(True, cached)
+        add_timing(timings, "cache", time.perf_counter() - start)
+        return models
+
+    def load_page(self, version, book_index, chapter, timings, until=None, fresh=False, chapters=1):
+        """Return the page for a chapter or a "first-last" range of `chapters` chapters, or None."""
+        cache_key = (version, BOOK_IDS[book_index], chapter)
+        html_text = None
+        if self.cache and not (self.refresh or fresh):
+            start = time.perf_counter()
+            html_text = self.cache.get(cache_key, chapters)
+            add_timing(timings, "cache", time.perf_counter() - start)
+        if html_text is None and not self.offline:
+            try:
+                html_text = fetch_with_retries(
+                    lambda: fetch_passage(
+                        BOOK_SEARCH_NAMES[book_index].replace(" ", ""), chapter, version, self.transport, timings, until
+                    ),
+                    self.limiter,
+                    self.retries,
+                    timings,
+                )
+            except (OSError, http.client.HTTPException) as exc:
+                self.failures[(version, book_index, chapter)] = str(exc)
+                return None
+            if self.cache:
+                start = time.perf_counter()
+                self.cache.put(cache_key, html_text)
+                add_timing(timings, "cache", time.perf_counter() - start)
+        return html_text
+
+    def fetch_batch(self, batch, source=None, with_notes=False, until=None, fresh=False):
+        """Return (page, timings) for one batch; fresh=True skips the cache and the store."""
+        version, book_index, chapters = batch
+        book = self.locales[0].books[book_index]
+        timings = {} if self.metrics else None
+        if self.is_bsb(version):
+            start = time.perf_counter()
+            page = [(build_bsb_chapter_content(book, chapter, self.bsb_index), [], {}) for chapter in chapters]
+            add_timing(timings, "parse", time.perf_counter() - start)
+            if self.store:
+                for chapter in chapters:
+                    self.store.put_chapter(
+                        version, book_index + 1, chapter, bsb_chapter_model(book, chapter, self.bsb_index)
+                    )
+            return page, timings
+        if source:
+            start = time.perf_counter()
+            page = [source.get(book_index, chapter) for chapter in chapters]
+            add_timing(timings, "parse", time.perf_counter() - start)
+            if self.store:
+                for chapter, model in zip(chapters, page):
+                    if model is not None:
+                        self.store.put_chapter(version, book_index + 1, chapter, model)
+            return page, timings
+        page = None if fresh else self.load_models(version, book_index, chapters, with_notes, timings)
+        if page is None and len(chapters) == 1:
+            page = self.load_page(version, book_index, chapters[0], timings, until, fresh)
+        elif page is None:
+            page = self.load_page(
+                version, book_index, f"{chapters[0]}-{chapters[-1]}", timings, until, fresh, len(chapters)
+            )
+        return page, timings
+
+    def iter_chapters(self, version, books=None, options=None, chapter=None, vaults=None, parallel_vaults=(), skip=()):
+        """Yield a RenderedChapter for every vault file of the chapters asked for."""
+        versions = [version] if isinstance(version, str) else list(version)
+        if vaults is None:
+            options = options or RenderOptions(False, False, False, False, False, False, not self.source)
+            vaults = [
+                Vault(
+                    locale.bible_name,
+                    f"{locale.bible_name} ({version})",
+                    version,
+                    locale_index,
+                    options._replace(clean_crossrefs=options.clean_crossrefs and not self.is_bsb(version)),
+                )
+                for version in versions
+                for locale_index, locale in enumerate(self.locales)
+            ]
+        plan = chapter_plan(range(66) if books is None else books, chapter)
+        infos_by_chapter = chapter_infos(self.locales, plan)
+        version_vaults = {version: [vault for vault in vaults if vault.version == version] for version in versions}
+        version_variants = {
+            version: [(vault.locale, vault.options) for vault in version_vaults[version]] for version in versions
+        }
+        with_notes = any(vault.options.footnotes for vault in vaults)
+        keep_models = self.cache is not None or self.store is not None
+        if self.bsb_index is None and any(self.is_bsb(version) for version in versions):
+            self.bsb_index = load_bsb_index(self.bsb_path)
+
+        keep_notes = with_notes or self.cache is not None
+
+        until = functools.partial(PassageWatch, keep_notes) if self.stream else None
+
+        batches = []
+        for book_index, chapters in plan:
+            book_batches = []
+            for version in versions:
+                version_batches = []
+                batch = []
+                for chapter in chapters:
+                    if (version, book_index, chapter) in skip:
+                        continue
+                    if batch and (chapter != batch[-1] + 1 or len(batch) >= self.batch_chapters):
+                        version_batches.append((version, book_index, batch))
+                        batch = []
+                    batch.append(chapter)
+                if batch:
+                    version_batches.append((version, book_index, batch))
+                book_batches.append(version_batches)
+            for position in range(max(len(version_batches) for version_batches in book_batches)):
+                batches.extend(
+                    version_batches[position] for version_batches in book_batches if position < len(version_batches)
+                )
+
+        source = None
+        if self.source:
+            resolve = book_resolver(
+                *(locale.books for locale in self.locales),
+                BOOK_IDS,
+                USFM_BOOK_IDS,
+                BOOK_SEARCH_NAMES,
+                *(names for locale in self.locales for names in (locale.abbr_medium, locale.abbr_short)),
+            )
+            source = SourceReader(
+                SOURCE_FORMATS[self.source_format](self.source, resolve),
+                ((book_index, chapter) for _, book_index, chapters in batches for chapter in chapters),
+            )
+
+        def fetch_batch(batch):
+            return self.fetch_batch(batch, source, with_notes, until)
+
+        def render_job(version, book_index, chapters, page, timings):
+            infos = [infos_by_chapter[(book_index, chapter)] for chapter in chapters]
+            return page, infos, version_variants[version], timings, keep_models, bool(parallel_vaults), self.parser
+
+        def checked(version, book_index, chapter, result):
+            """Return the chapter's result, downloaded once more if it looks broken, and note anomalies."""
+            if self.verse_check == "off":
+                return result
+            markers, truncated = result[4]
+            anomaly = verse_anomaly(version, book_index, chapter, markers)
+            refetch = self.verse_check == "refetch" and not (source or self.offline or self.is_bsb(version))
+            if refetch and (truncated or (anomaly and anomaly[0] == "gap")):
+                self.refetched += 1
+                page, timings = self.fetch_batch((version, book_index, [chapter]), fresh=True)
+                retry = render_batch(render_job(version, book_index, [chapter], page, timings))[0]
+
+                def score(candidate):
+                    markers, truncated = candidate[4]
+                    return not truncated, len(set(verse_numbers(markers)))
+
+                better = retry[0] is not None and score(retry) > score(result)
+                kept, dropped = (retry, result) if better else (result, retry)
+                if self.metrics:
+                    for stage, value in dropped[2].items():
+                        add_timing(kept[2], stage, value)
+                result = kept
+                markers, truncated = result[4]
+                anomaly = verse_anomaly(version, book_index, chapter, markers)
+            if truncated and not anomaly:
+                anomaly = ("truncated", "the page ends before the passage does")
+            if anomaly:
+                self.anomalies.append((version, book_index, chapter, *anomaly))
+            return result
+
+        parallel_verses = {}
+
+        def rendered_files(version, book_index, chapter, result):
+            bodies, model, timings, verses, _ = result
+            start = time.perf_counter()
+            if model is not None and self.cache:
+                self.cache.put(self.model_key(version, book_index, chapter), json.dumps(model))
+            if model is not None and self.store:
+                self.store.put_chapter(version, book_index + 1, chapter, model)
+            if self.metrics:
+                add_timing(timings, "write", time.perf_counter() - start)
+                self.metrics.add(self.chapter_label(version, book_index, chapter, versions), timings)
+            infos = infos_by_chapter[(book_index, chapter)]
+            for vault, (text, footnotes) in zip(version_vaults[version], bodies):
+                info = infos[vault.locale]
+                yield RenderedChapter(
+                    vault, version, book_index, chapter, chapter_path(info), *split_front_matter(text), footnotes, timings
+                )
+            if not parallel_vaults:
+                return
+            parallel_verses.setdefault((book_index, chapter), {})[version] = verses
+            if len(parallel_verses[(book_index, chapter)]) < len(versions):
+                return
+            verses = parallel_verses.pop((book_index, chapter))
+            table = parallel_table(versions, [verses[version] for version in versions])
+            for vault in parallel_vaults:
+                info = infos[vault.locale]
+                text = render_chapter(info, "\n" + table, [], {}, vault.options)
+                yield RenderedChapter(
+                    vault, vault.version, book_index, chapter, chapter_path(info), *split_front_matter(text), [], timings
+                )
+
+        fetched = ordered_map(fetch_batch, batches, self.jobs)
+        rendered = ordered_map(
+            render_batch,
+            (
+                render_job(version, book_index, chapters, page, timings)
+                for (page, timings), (version, book_index, chapters) in zip(fetched, batches)
+            ),
+            self.workers,
+            ProcessPoolExecutor,
+        )
+
+        deferred = []
+        for (version, book_index, chapters), results in zip(batches, rendered):
+            if results is None:
+                self.batch_fallbacks.append(f"{self.locales[0].books[book_index]} {chapters[0]}-{chapters[-1]}")
+                results = []
+                for chapter in chapters:
+                    page, timings = fetch_batch((version, book_index, [chapter]))
+                    results.extend(render_batch(render_job(version, book_index, [chapter], page, timings)))
+            for chapter, result in zip(chapters, results):
+                if result[0] is None:
+                    deferred.append((version, book_index, chapter))
+                else:
+                    yield from rendered_files(version, book_index, chapter, checked(version, book_index, chapter, result))
+
+        self.retried += len(deferred)
+        for version, book_index, chapter in deferred:
+            page, timings = fetch_batch((version, book_index, [chapter]))
+            result = render_batch(render_job(version, book_index, [chapter], page, timings))[0]
+            if result[0] is None:
+                self.failed.append((version, book_index, chapter))
+            else:
+                yield from rendered_files(version, book_index, chapter, checked(version, book_index, chapter, result))
+
+
+def search(argv):
+    """`bg2obs.py search QUERY`: look verses up in a --store database."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("-v", dest="version")
+    parser.add_argument("-l", dest="language", default="en")
+    parser.add_argument("-h", dest="help", action="store_true")
+    parser.add_argument("--store", dest="store", default=DEFAULT_STORE)
+    parser.add_argument("--limit", dest="limit", type=int, default=DEFAULT_SEARCH_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.help or not args.query:
+        show_help()
+        return 0 if args.help else 1
+
+    if not os.path.exists(args.store):
+        print(f"Store not found: {args.store}")
+        return 1
+
+    books_path = os.path.join("locales", args.language, "books.txt")
+    if not os.path.exists(books_path):
+        print("Language not found!")
+        return 1
+    book_array = load_lines(books_path)
+
+    store = VerseStore(args.store)
+    start = time.perf_counter()
+    try:
+        rows = store.search(args.query, args.version.upper() if args.version else None, args.limit)
+    except sqlite3.OperationalError as exc:
+        print(f"Invalid search: {exc}")
+        return 1
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - start
+
+    for version, book, chapter, verse, text in rows:
+        reference = f"{book_array[book - 1]} {chapter}:{verse}"
+        if not args.version:
+            reference += f" ({version})"
+        print(f"{reference}  {text}")
+    print(f"{len(rows)} verse(s) in {elapsed * 1000:.1f} ms.")
+    return 0
+
+
+def merge(argv):
+    """`bg2obs.py merge [FOLDER]`: finish a --shard run with the indexes and book overviews."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("folder", nargs="?", default=".")
+    parser.add_argument("-h", dest="help", action="store_true")
+    parser.add_argument("--fsync", dest="fsync", choices=FSYNC_POLICIES, default="none")
+    args = parser.parse_args(argv)
+
+    if args.help:
+        show_help()
+        return 0
+
+    manifests = []
+    for name in sorted(os.listdir(args.folder)):
+        if SHARD_MANIFEST_RE.match(name):
+            with open(os.path.join(args.folder, name), "r", encoding="utf-8") as handle:
+                manifests.append(json.load(handle))
+    if not manifests:
+        print(f"No shard manifests (shard-I-of-N.json) in {args.folder}.")
+        return 1
+    shards = manifests[0]["shards"]
+    if any(manifest["shards"] != shards for manifest in manifests):
+        print("The shard manifests come from runs with different shard counts.")
+        return 1
+    if any(manifest["vaults"] != manifests[0]["vaults"] for manifest in manifests):
+        print("The shard manifests describe different vaults; run every shard with the same options.")
+        return 1
+    missing = sorted(set(range(1, shards + 1)) - {manifest["shard"] for manifest in manifests})
+    if missing:
+        print(f"Missing shard(s): {', '.join(f'{shard}/{shards}' for shard in missing)}.")
+        return 1
+
+    writer = VaultWriter(args.fsync)
+    for vault in manifests[0]["vaults"]:
+        for title, abbreviation, chapters in vault["books"]:
+            overview_file = book_overview(vault["name"], title, abbreviation, chapters[0])
+            writer.write(os.path.join(args.folder, vault["folder"], title, f"{title}.md"), overview_file)
+        writer.write(os.path.join(args.folder, f"{vault['name']}.md"), vault_index(vault["folder"], vault["books"]))
+    writer.close()
+
+    failed = [label for manifest in manifests for label in manifest["failed"]]
+    absent = [
+        os.path.join(folder, path)
+        for manifest in manifests
+        for folder, paths in manifest["files"].items()
+        for path in paths
+        if not os.path.exists(os.path.join(args.folder, folder, path))
+    ]
+    for label in failed:
+        print(f"{label} failed in its shard.")
+    for manifest in manifests:
+        for anomaly in manifest.get("anomalies", []):
+            print(f"{anomaly}.")
+    if absent:
+        print(f"{len(absent)} chapter file(s) are missing, e.g. {absent[0]}.")
+    return 1 if failed or absent else 0
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "search":
+        return search(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "merge":
+        return merge(sys.argv[2:])
+
     parser = argparse.ArgumentParser(add_help=False)
-    parser.add_argument("-v", dest="version", default="WEB")
+    parser.add_argument("-v", dest="version")
     parser.add_argument("-s", dest="abbr_short", action="store_true")
     parser.add_argument("-b", dest="bold_words", action="store_true")
     parser.add_argument("-e", dest="include_headers", action="store_true")
@@ -614,190 +3508,449 @@ def main():
     parser.add_argument("--list-versions", dest="list_versions", action="store_true")
     parser.add_argument("--footnotes", dest="footnotes", action="store_true")
     parser.add_argument("--abbr", dest="abbr_medium", action="store_true")
+    parser.add_argument("--resume", dest="resume", action="store_true")
+    parser.add_argument("--base-url", dest="base_url", default=BASE_URL)
+    parser.add_argument("--batch-chapters", dest="batch_chapters", type=int, default=1)
+    parser.add_argument("--jobs", dest="jobs", type=int, default=1)
+    parser.add_argument("--workers", dest="workers", type=int, default=1)
+    parser.add_argument("--rate", dest="rate", type=float, default=DEFAULT_RATE)
+    parser.add_argument("--retries", dest="retries", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--cache-dir", dest="cache_dir")
+    parser.add_argument("--cache-ttl", dest="cache_ttl", type=float)
+    parser.add_argument("--cache-max-size", dest="cache_max_size", type=float)
+    parser.add_argument("--offline", dest="offline", action="store_true")
+    parser.add_argument("--refresh", dest="refresh", action="store_true")
+    parser.add_argument("--metrics", dest="metrics")
+    parser.add_argument("--variant", dest="variants", action="append", default=[])
+    parser.add_argument("--store", dest="store")
+    parser.add_argument("--source", dest="source")
+    parser.add_argument("--source-format", dest="source_format", choices=sorted(SOURCE_FORMATS))
+    parser.add_argument("--parallel", dest="parallel", action="store_true")
+    parser.add_argument("--fsync", dest="fsync", choices=FSYNC_POLICIES, default="none")
+    parser.add_argument("--output-archive", dest="output_archive")
+    parser.add_argument("--stream", dest="stream", action="store_true")
+    parser.add_argument("--shard", dest="shard")
+    parser.add_argument("--parser", dest="parser", choices=sorted(PARSER_ENGINES), default="html")
+    parser.add_argument("--verse-check", dest="verse_check", choices=VERSE_CHECKS, default="refetch")
     args = parser.parse_args()
 
     if args.help:
         show_help()
         return 0
 
-    args.version = args.version.upper()
+    if args.source and not args.version:
+        args.version = os.path.splitext(os.path.basename(os.path.normpath(args.source)))[0]
+    versions = []
+    for version in (args.version or "WEB").upper().split(","):
+        version = version.strip()
+        if version and version not in versions:
+            versions.append(version)
 
-    if args.list_versions:
-        return print_versions()
-
-    print(
-        f"I confirm that I have checked and understand the copyright/license "
-        f"conditions for {args.version} and wish to continue downloading it in its entirety?"
-    )
-    response = input("Type 'yes' to continue: ").strip().lower()
-    if response not in {"yes", "y"}:
+    if args.source and len(versions) > 1:
+        print("--source builds one version at a time.")
         return 1
 
-    translation_folder = os.path.join("locales", args.language)
-    bible_name_path = os.path.join(translation_folder, "name.txt")
-    if not os.path.exists(bible_name_path):
-        print("Language not found!")
+    if args.parallel and len(versions) < 2:
+        print("--parallel needs at least two versions, e.g. -v WEB,KJV.")
         return 1
 
-    bible_name = load_lines(bible_name_path)[0]
-    book_array = load_lines(os.path.join(translation_folder, "books.txt"))
-    abbr_medium_array = load_lines(os.path.join(translation_folder, "booksAbbr.txt"))
-    abbr_short_array = load_lines(os.path.join(translation_folder, "booksAbbrShort.txt"))
-    bsb_path = os.path.join(translation_folder, "bsb.txt")
+    transport = HTTPTransport(args.base_url, max_idle=max(args.jobs, 1))
+    manifests = {}
+    store = None
+    archive = None
+    try:
+        if args.list_versions:
+            return print_versions(transport)
 
-    if len(book_array) != 66 or len(abbr_medium_array) != 66 or len(abbr_short_array) != 66:
-        print("Locale files must include 66 books and abbreviations.")
-        return 1
+        if not args.source:
+            print(
+                f"I confirm that I have checked and understand the copyright/license "
+                f"conditions for {', '.join(versions)} and wish to continue downloading it in its entirety?"
+            )
+            response = input("Type 'yes' to continue: ").strip().lower()
+            if response not in {"yes", "y"}:
+                return 1
 
-    if args.abbr_short:
-        abbr_array = abbr_short_array
-    elif args.abbr_medium:
-        abbr_array = abbr_medium_array
-    else:
-        abbr_array = book_array
+        locales = []
+        for language in args.language.split(","):
+            language = language.strip()
+            if any(locale.language == language for locale in locales):
+                continue
+            locale = load_locale(language, args.abbr_short, args.abbr_medium)
+            if locale is None:
+                print("Language not found!")
+                return 1
+            if len(locale.books) != 66 or len(locale.abbr_medium) != 66 or len(locale.abbr_short) != 66:
+                print("Locale files must include 66 books and abbreviations.")
+                return 1
+            locales.append(locale)
 
-    if args.chapter is not None and not args.book:
-        print("--chapter requires --book.")
-        return 1
+        book_array = locales[0].books
+        abbr_array = locales[0].abbreviations
+        bsb_path = os.path.join("locales", locales[0].language, "bsb.txt")
+
+        if args.chapter is not None and not args.book:
+            print("--chapter requires --book.")
+            return 1
+
+        if args.jobs < 1 or args.workers < 1:
+            print("--jobs and --workers must be at least 1.")
+            return 1
 
-    book_indices = list(range(66))
-    if args.book:
-        book_index = resolve_book_index(args.book, book_array, abbr_array)
-        if book_index is None:
-            print(f"Book not found: {args.book}")
+        if args.batch_chapters < 1:
+            print("--batch-chapters must be at least 1.")
             return 1
-        book_indices = [book_index]
 
-    title_max = max(len(title) for title in book_array) if args.verbose else 0
-    bible_folder = f"{bible_name} ({args.version})"
+        if args.retries < 0:
+            print("--retries cannot be negative.")
+            return 1
+
+        if (args.offline or args.refresh) and not (args.cache_dir or args.store):
+            print("--offline and --refresh require --cache-dir or --store.")
+            return 1
+
+        if args.offline and args.refresh:
+            print("--offline and --refresh cannot be combined.")
+            return 1
 
-    with open(f"{bible_name}.md", "w", encoding="utf-8") as main_index:
-        main_index.write(f"# {bible_folder}")
+        if args.output_archive and not archive_format(args.output_archive):
+            print(f"--output-archive must end in one of: {', '.join(ARCHIVE_FORMATS)}.")
+            return 1
 
-    if args.verbose:
-        print(f"Starting download of {args.version} Bible.", end="")
+        if args.output_archive and args.resume:
+            print("--resume cannot be combined with --output-archive.")
+            return 1
 
-    bsb_index = None
-    use_bsb = args.version == BSB_VERSION and os.path.exists(bsb_path)
-    if use_bsb:
-        bsb_index = load_bsb_index(bsb_path)
+        shard = None
+        if args.shard:
+            shard = parse_shard(args.shard)
+            if shard is None:
+                print(f"Invalid --shard {args.shard!r}: expected I/N with 1 <= I <= N, e.g. 2/4.")
+                return 1
+            if args.output_archive:
+                print("--shard cannot be combined with --output-archive.")
+                return 1
+
+        source_format = None
+        if args.source:
+            if not os.path.exists(args.source):
+                print(f"Source not found: {args.source}")
+                return 1
+            source_format = args.source_format or detect_source_format(args.source)
+            if source_format not in SOURCE_FORMATS:
+                print(f"Unknown source format; use --source-format with one of: {', '.join(SOURCE_FORMATS)}.")
+                return 1
+
+        book_indices = list(range(66))
+        if args.book:
+            book_index = None
+            for locale in locales:
+                book_index = resolve_book_index(args.book, locale.books, locale.abbreviations)
+                if book_index is not None:
+                    break
+            if book_index is None:
+                print(f"Book not found: {args.book}")
+                return 1
+            book_indices = [book_index]
 
-    for book_index in book_indices:
-        book = book_array[book_index]
-        last_chapter = BOOK_CHAPTERS[book_index]
-        abbreviation = abbr_array[book_index]
         if args.chapter is not None:
+            last_chapter = BOOK_CHAPTERS[book_indices[0]]
             if args.chapter < 1 or args.chapter > last_chapter:
-                print(f"Chapter out of range for {book}: {args.chapter}")
+                print(f"Chapter out of range for {book_array[book_indices[0]]}: {args.chapter}")
                 return 1
-            chapters_to_download = [args.chapter]
-        else:
-            chapters_to_download = list(range(1, last_chapter + 1))
+
+        plan = chapter_plan(book_indices, args.chapter)
+        title_max = max(len(title) for title in book_array) if args.verbose else 0
 
         if args.verbose:
-            show_progress_bar(book, 0, chapters_to_download[-1], True, title_max)
+            print(f"Starting download of {', '.join(versions)} Bible.", end="")
 
-        with open(f"{bible_name}.md", "a", encoding="utf-8") as main_index:
-            main_index.write(f"\n* {book}:")
+        use_bsb = not args.source and BSB_VERSION in versions and os.path.exists(bsb_path)
 
-        for idx, chapter in enumerate(chapters_to_download):
-            prev_chapter = chapters_to_download[idx - 1] if idx > 0 else None
-            next_chapter = (
-                chapters_to_download[idx + 1] if idx + 1 < len(chapters_to_download) else None
-            )
+        def is_bsb(version):
+            return use_bsb and version == BSB_VERSION
 
-            this_file = f"{abbreviation} {chapter}"
-            prev_file = f"{abbreviation} {prev_chapter}" if prev_chapter else None
-            next_file = f"{abbreviation} {next_chapter}" if next_chapter else None
+        cache = None
+        if args.cache_dir and not args.source and any(not is_bsb(version) for version in versions):
+            cache = ResponseCache(
+                args.cache_dir,
+                ttl=args.cache_ttl * 86400 if args.cache_ttl is not None else None,
+                max_bytes=args.cache_max_size * 1024 * 1024 if args.cache_max_size is not None else None,
+            )
 
-            with open(f"{bible_name}.md", "a", encoding="utf-8") as main_index:
-                main_index.write(f" [[{this_file}|{chapter}]]")
+        metrics = RunMetrics() if args.metrics else None
+        options = RenderOptions(
+            include_headers=args.include_headers,
+            bold_words=args.bold_words,
+            footnotes=args.footnotes,
+            aliases=args.aliases,
+            bc_inline=args.bc_inline,
+            bc_yaml=args.bc_yaml,
+            clean_crossrefs=not args.source,
+        )
+        vault_options = [(None, options)]
+        for spec in args.variants:
+            variant = parse_variant(spec, options)
+            if variant is None:
+                print(f"Invalid --variant {spec!r}: expected FLAGS:NAME with FLAGS from '{''.join(VARIANT_FLAGS)}'.")
+                return 1
+            if variant[0] in (name for name, _ in vault_options):
+                print(f"--variant name {variant[0]!r} is used twice.")
+                return 1
+            vault_options.append(variant)
 
-            if use_bsb:
-                chapter_content = build_bsb_chapter_content(book, chapter, bsb_index)
-                footnotes = []
-                footnote_map = {}
-            else:
-                book_no_spaces = book.replace(" ", "")
-                html_text = fetch_passage(book_no_spaces, chapter, args.version)
-                chapter_content, footnotes, footnote_map = parse_passage(
-                    html_text,
-                    include_headers=args.include_headers,
-                    bold_words=args.bold_words,
-                    include_footnotes=args.footnotes,
-                )
+        def add_vault(vaults, name, folder, version, locale_index, vault_opts):
+            if any(vault.folder == folder or vault.name == name for vault in vaults):
+                print(f"Two vaults would be written to {folder!r}; give them different names.")
+                return False
+            vaults.append(Vault(name, folder, version, locale_index, vault_opts))
+            return True
 
-            if not chapter_content:
-                print(f"\nFailed to download {book} {chapter}.")
-                return 1
-            if not use_bsb:
-                chapter_content = remove_crossref_lines(chapter_content, book, chapter)
-
-            if not args.bc_inline and not args.bc_yaml:
-                navigation = f"[[{book}]]"
-                if prev_chapter:
-                    navigation = f"[[{prev_file}|< {book} {prev_chapter}]] | " + navigation
-                if next_chapter:
-                    navigation = navigation + f" | [[{next_file}|{book} {next_chapter} >]]"
-            else:
-                navigation = f"(up:: [[{book}]])"
-                if prev_chapter:
-                    navigation = f"(previous:: [[{prev_file}|< {book} {prev_chapter}]]) | " + navigation
-                if next_chapter:
-                    navigation = navigation + f" | (next:: [[{next_file}|{book} {next_chapter} >]])"
-
-            if args.footnotes:
-                chapter_content = chapter_content + format_footnotes(
-                    footnotes, footnote_map, book, chapter, abbreviation
+        vaults = []
+        for version in versions:
+            for locale_index, locale in enumerate(locales):
+                for name, vault_opts in vault_options:
+                    if name is None:
+                        name = locale.bible_name
+                    elif len(locales) > 1:
+                        name = f"{name} ({locale.language})"
+                    folder = f"{name} ({version})"
+                    if len(versions) > 1:
+                        name = folder
+                    vault_opts = vault_opts._replace(clean_crossrefs=vault_opts.clean_crossrefs and not is_bsb(version))
+                    if not add_vault(vaults, name, folder, version, locale_index, vault_opts):
+                        return 1
+        parallel_vaults = []
+        if args.parallel:
+            parallel_options = options._replace(footnotes=False, clean_crossrefs=False)
+            for locale_index, locale in enumerate(locales):
+                name = f"{locale.bible_name} ({', '.join(versions)})"
+                if not add_vault(parallel_vaults, name, name, versions, locale_index, parallel_options):
+                    return 1
+        manifest_suffix = f".shard-{shard[0]}-of-{shard[1]}" if shard else ""
+        if not args.output_archive:
+            manifests = {
+                vault.folder: Manifest(f"{vault.folder}{manifest_suffix}.manifest.jsonl")
+                for vault in vaults + parallel_vaults
+            }
+        store = VerseStore(args.store) if args.store else None
+
+        builder = VaultBuilder(
+            locales,
+            transport=transport,
+            rate=args.rate,
+            retries=args.retries,
+            jobs=args.jobs,
+            workers=args.workers,
+            batch_chapters=args.batch_chapters,
+            cache=cache,
+            store=store,
+            source=args.source,
+            source_format=source_format,
+            offline=args.offline,
+            refresh=args.refresh,
+            stream=args.stream,
+            parser=args.parser,
+            verse_check=args.verse_check,
+            metrics=metrics,
+        )
+
+        def chapter_settings(info, vault):
+            return hash_text(json.dumps([vault.version, locales[vault.locale].language, vault.options, info]))
+
+        def is_current(vault, infos):
+            info = infos[vault.locale]
+            return manifests[vault.folder].is_current(vault.folder, chapter_path(info), chapter_settings(info, vault))
+
+        infos_by_chapter = chapter_infos(locales, plan)
+        shard_plan = plan
+        skip = set()
+        if shard:
+            in_shard = set(
+                shard_chapters(plan, *shard, cost=lambda book_index, chapter: VERSE_COUNTS[book_index][chapter - 1])
+            )
+            shard_plan = []
+            for book_index, chapters in plan:
+                kept = [chapter for chapter in chapters if (book_index, chapter) in in_shard]
+                if kept:
+                    shard_plan.append((book_index, kept))
+                skip.update(
+                    (version, book_index, chapter)
+                    for chapter in chapters
+                    if (book_index, chapter) not in in_shard
+                    for version in versions
                 )
-            title = f"# {book} {chapter}"
-            yaml_needed = args.bc_yaml or args.aliases
-            if args.bc_yaml:
-                chapter_body = f"{title}\n\n***\n{chapter_content}"
-            else:
-                chapter_body = f"{title}\n\n{navigation}\n\n***\n{chapter_content}"
-
-            if yaml_needed:
-                yaml_lines = ["---"]
-                if args.aliases:
-                    alias_long = f"{book} {chapter}"
-                    alias_med = f"{abbr_medium_array[book_index]} {chapter}"
-                    alias_short = f"{abbr_short_array[book_index]} {chapter}"
-                    aliases = []
-                    for alias in (alias_long, alias_med, alias_short):
-                        if alias not in aliases:
-                            aliases.append(alias)
-                    if len(aliases) > 1:
-                        yaml_lines.append(f"aliases: [{', '.join(aliases)}]")
-                if args.bc_yaml:
-                    if prev_chapter:
-                        yaml_lines.append(f"previous: ['{prev_file}']")
-                    yaml_lines.append(f"up: ['{book}']")
-                    if next_chapter:
-                        yaml_lines.append(f"next: ['{next_file}']")
-                yaml_lines.append("---\n\n")
-                chapter_body = "\n".join(yaml_lines) + chapter_body
-
-            out_dir = os.path.join(bible_folder, book)
-            os.makedirs(out_dir, exist_ok=True)
-            out_path = os.path.join(out_dir, f"{this_file}.md")
-            with open(out_path, "w", encoding="utf-8") as handle:
-                handle.write(chapter_body)
 
+        up_to_date = set()
+        if args.resume:
+            for book_index, chapters in shard_plan:
+                for chapter in chapters:
+                    infos = infos_by_chapter[(book_index, chapter)]
+                    if not all(is_current(vault, infos) for vault in parallel_vaults):
+                        continue
+                    current = [
+                        version
+                        for version in versions
+                        if all(is_current(vault, infos) for vault in vaults if vault.version == version)
+                    ]
+                    if parallel_vaults and len(current) < len(versions):
+                        continue
+                    up_to_date.update((version, book_index, chapter) for version in current)
             if args.verbose:
-                show_progress_bar(book, chapter, chapters_to_download[-1], False, title_max)
-            time.sleep(0.2)
+                print(f"\nResuming: {len(up_to_date)} chapter(s) already up to date.", end="")
 
-        first_chapter = chapters_to_download[0]
-        overview_file = f"links: [[{bible_name}]]\n# {book}\n\n[[{abbreviation} {first_chapter}|Start Reading >]]"
-        overview_path = os.path.join(bible_folder, book, f"{book}.md")
-        with open(overview_path, "w", encoding="utf-8") as handle:
-            handle.write(overview_file)
+        def chapter_label(version, book_index, chapter):
+            return builder.chapter_label(version, book_index, chapter, versions)
 
-    if args.verbose:
-        print("\nDownload complete. Markdown files ready for Obsidian import.")
-    return 0
+        if args.output_archive:
+            writer = archive = ArchiveWriter(args.output_archive, args.fsync)
+        else:
+            writer = VaultWriter(args.fsync)
+
+        def vault_books(vault):
+            locale = locales[vault.locale]
+            return [
+                (locale.books[book_index], locale.abbreviations[book_index], chapters) for book_index, chapters in plan
+            ]
 
+        done = {
+            book_index: sum(
+                (version, book_index, chapter) in up_to_date for version in versions for chapter in chapters
+            )
+            for book_index, chapters in shard_plan
+        }
+        plan_position = {book_index: position for position, (book_index, _) in enumerate(shard_plan)}
+        started = 0
+
+        def show_progress(book_index, start_new_line):
+            chapters = shard_plan[plan_position[book_index]][1]
+            completed = chapters[done[book_index] // len(versions) - 1] if done[book_index] >= len(versions) else 0
+            show_progress_bar(book_array[book_index], completed, chapters[-1], start_new_line, title_max)
+
+        def start_books(position):
+            """Write the overviews of the books up to `position` and start their progress bars."""
+            nonlocal started
+            while started <= position:
+                book_index, chapters = shard_plan[started]
+                for vault in [] if shard else vaults + parallel_vaults:
+                    locale = locales[vault.locale]
+                    title = locale.books[book_index]
+                    overview_file = book_overview(vault.name, title, locale.abbreviations[book_index], chapters[0])
+                    writer.write(os.path.join(vault.folder, title, f"{title}.md"), overview_file)
+                if args.verbose:
+                    show_progress(book_index, True)
+                started += 1
+
+        chapter_key = None
+        for rendered in builder.iter_chapters(
+            versions,
+            books=book_indices,
+            chapter=args.chapter,
+            vaults=vaults,
+            parallel_vaults=parallel_vaults,
+            skip=skip | up_to_date,
+        ):
+            book_index = rendered.book_index
+            start_books(plan_position[book_index])
+            start = time.perf_counter()
+            text = rendered.front_matter + rendered.body
+            writer.write(os.path.join(rendered.vault.folder, rendered.path), text)
+            manifest = manifests.get(rendered.vault.folder)
+            if manifest:
+                info = infos_by_chapter[(book_index, rendered.chapter)][rendered.vault.locale]
+                manifest.record(rendered.path, chapter_settings(info, rendered.vault), text)
+            add_timing(rendered.timings, "write", time.perf_counter() - start)
+            key = (rendered.version, book_index, rendered.chapter)
+            if key != chapter_key and not isinstance(rendered.version, list):
+                chapter_key = key
+                done[book_index] += 1
+                if args.verbose and done[book_index] % len(versions) == 0 and started == plan_position[book_index] + 1:
+                    show_progress(book_index, False)
+        start_books(len(shard_plan) - 1)
+
+        failed = builder.failed
+        anomalies = [f"{chapter_label(*key)}: {detail}" for *key, _, detail in builder.anomalies]
+        if shard:
+            shard_manifest = {
+                "shard": shard[0],
+                "shards": shard[1],
+                "vaults": [
+                    {"name": vault.name, "folder": vault.folder, "books": vault_books(vault)}
+                    for vault in vaults + parallel_vaults
+                ],
+                "files": {
+                    vault.folder: [
+                        chapter_path(infos_by_chapter[(book_index, chapter)][vault.locale])
+                        for book_index, chapters in shard_plan
+                        for chapter in chapters
+                    ]
+                    for vault in vaults + parallel_vaults
+                },
+                "failed": [chapter_label(*key) for key in failed],
+                "anomalies": anomalies,
+            }
+            writer.write(f"shard-{shard[0]}-of-{shard[1]}.json", json.dumps(shard_manifest))
+        else:
+            for vault in vaults + parallel_vaults:
+                writer.write(f"{vault.name}.md", vault_index(vault.folder, vault_books(vault)))
+
+        if builder.retried and args.verbose:
+            print(f"\nRetried {builder.retried} chapter(s) that failed.", end="")
+        if builder.refetched and args.verbose:
+            print(f"\nDownloaded {builder.refetched} chapter(s) again for missing verses.", end="")
+
+        writer.close()
+        archive = None
+        for manifest in manifests.values():
+            manifest.close(compact=not failed)
+        for version, book_index, chapter in failed:
+            label = chapter_label(version, book_index, chapter)
+            if args.source:
+                print(f"\n{label} is not in {args.source}.")
+            elif args.offline:
+                print(f"\n{label} is not in the cache.")
+            elif (version, book_index, chapter) in builder.failures:
+                print(f"\nFailed to download {label}: {builder.failures[(version, book_index, chapter)]}")
+            else:
+                print(f"\nFailed to download {label}.")
+        for anomaly in anomalies:
+            print(f"\n{anomaly}.")
+        if metrics:
+            metrics.write(
+                args.metrics,
+                failed=[chapter_label(*key) for key in failed],
+                requests=transport.requests,
+                connections_opened=transport.connections_opened,
+                connections_reused=transport.connections_reused,
+                cache_hits=cache.hits if cache else 0,
+                cache_misses=cache.misses if cache else 0,
+                batch_fallbacks=builder.batch_fallbacks,
+                refetched=builder.refetched,
+                anomalies=anomalies,
+            )
+        if args.verbose:
+            print("\nDownload complete. Markdown files ready for Obsidian import.")
+            if transport.requests:
+                print(
+                    f"{transport.requests} requests over {transport.connections_opened} connection(s), "
+                    f"{transport.connections_reused} reused."
+                )
+            if cache:
+                print(f"Cache: {cache.hits} chapters found, {cache.misses} missing.")
+            if builder.batch_fallbacks:
+                print(
+                    "Fetched chapter by chapter after a batch did not split cleanly: "
+                    f"{', '.join(builder.batch_fallbacks)}"
+                )
+        return 1 if failed else 0
+    finally:
+        if archive is not None:
+            archive.abort()
+        for manifest in manifests.values():
+            manifest.close()
+        if store:
+            store.close()
+        transport.close()
 
 if __name__ == "__main__":
     raise SystemExit(main())